@@ -0,0 +1,191 @@
+from typing import BinaryIO, Iterator, Optional, Tuple
+import io
+import os
+import wave
+import numpy as np
+
+# Long recordings are cut into overlapping segments transcribed in parallel
+TRANSCRIBE_SEGMENT_SECONDS = int(os.getenv("TRANSCRIBE_SEGMENT_SECONDS", 120))
+TRANSCRIBE_OVERLAP_SECONDS = int(os.getenv("TRANSCRIBE_OVERLAP_SECONDS", 2))
+
+# PCM audio is downmixed to mono 16-bit and downsampled to a speech rate before upload
+AUDIO_NORMALIZE = os.getenv("AUDIO_NORMALIZE", "true").lower() in ("true", "1", "t")
+AUDIO_TARGET_RATE = int(os.getenv("AUDIO_TARGET_RATE", 16000))
+
+# Gemini takes at most ~20MB of inline data per request; larger files that
+# can't be split are handed over through Cloud Storage instead
+AUDIO_INLINE_MAX_BYTES = int(os.getenv("AUDIO_INLINE_MAX_BYTES", 16 * 1024 * 1024))
+AUDIO_MAX_UPLOAD_BYTES = int(os.getenv("AUDIO_MAX_UPLOAD_BYTES", 100 * 1024 * 1024))
+
+
+class AudioTooLargeError(ValueError):
+    """The upload can't be split and is too large to send inline."""
+
+    def __init__(self, size: int, mime_type: str):
+        super().__init__(f"{mime_type} audio of {size} bytes exceeds the {AUDIO_INLINE_MAX_BYTES} byte inline limit")
+        self.size = size
+        self.mime_type = mime_type
+
+
+class AudioStats:
+    """Bytes read from an upload versus bytes sent to the model."""
+
+    def __init__(self):
+        self.input_bytes = 0
+        self.output_bytes = 0
+
+    @property
+    def bytes_saved(self) -> int:
+        return max(0, self.input_bytes - self.output_bytes)
+
+
+def sniff_mime_type(head: bytes) -> str:
+    """Detects the audio container from the first bytes of the upload."""
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        return "audio/wav"
+    if head[:4] == b"FORM" and head[8:12] in (b"AIFF", b"AIFC"):
+        return "audio/aiff"
+    if head[:3] == b"ID3" or (len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0):
+        if len(head) > 1 and head[1] & 0xF6 == 0xF0:
+            return "audio/aac"
+        return "audio/mpeg"
+    if head[:4] == b"OggS":
+        return "audio/ogg"
+    if head[:4] == b"fLaC":
+        return "audio/flac"
+    if head[4:8] == b"ftyp":
+        return "audio/mp4"
+    if head[:4] == b"\x1a\x45\xdf\xa3":
+        return "audio/webm"
+    return "audio/wav"
+
+
+def _wav_bytes(params, frames: bytes) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as out:
+        out.setparams(params)
+        out.writeframes(frames)
+    return buffer.getvalue()
+
+
+def _pcm_to_float(frames: bytes, sample_width: int) -> np.ndarray:
+    if sample_width == 1:
+        return (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128) / 128
+    if sample_width == 2:
+        return np.frombuffer(frames, dtype="<i2").astype(np.float32) / 32768
+    if sample_width == 3:
+        raw = np.frombuffer(frames, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        samples = raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)
+        samples = np.where(samples & 0x800000, samples - 0x1000000, samples)
+        return samples.astype(np.float32) / 8388608
+    return np.frombuffer(frames, dtype="<i4").astype(np.float32) / 2147483648
+
+
+def normalize_pcm(frames: bytes, params, target_rate: int = AUDIO_TARGET_RATE) -> Tuple[bytes, int]:
+    """Downmixes PCM frames to mono 16-bit and downsamples to `target_rate`.
+
+    Returns (frames, sample_rate). Audio already at or below the target rate
+    keeps its rate.
+    """
+    samples = _pcm_to_float(frames, params.sampwidth)
+    samples = samples[: len(samples) - len(samples) % params.nchannels]
+    mono = samples.reshape(-1, params.nchannels).mean(axis=1)
+
+    rate = params.framerate
+    if rate > target_rate and len(mono):
+        ratio = rate / target_rate
+        # Box filter over the decimation window keeps aliasing out of the speech band
+        window = int(round(ratio))
+        if window > 1:
+            mono = np.convolve(mono, np.ones(window, dtype=np.float32) / window, mode="same")
+        count = int(len(mono) / ratio)
+        mono = np.interp(np.arange(count) * ratio, np.arange(len(mono)), mono)
+        rate = target_rate
+
+    pcm = np.clip(np.rint(mono * 32767), -32768, 32767).astype("<i2")
+    return pcm.tobytes(), rate
+
+
+def _segment_bytes(params, frames: bytes) -> bytes:
+    if not AUDIO_NORMALIZE:
+        return _wav_bytes(params, frames)
+
+    pcm, rate = normalize_pcm(frames, params)
+    return _wav_bytes(params._replace(nchannels=1, sampwidth=2, framerate=rate, nframes=len(pcm) // 2), pcm)
+
+
+def iter_segments(
+    stream: BinaryIO,
+    segment_seconds: int = TRANSCRIBE_SEGMENT_SECONDS,
+    overlap_seconds: int = TRANSCRIBE_OVERLAP_SECONDS,
+    stats: Optional[AudioStats] = None,
+) -> Iterator[Tuple[bytes, str]]:
+    """Yields (audio_bytes, mime_type) segments read lazily from `stream`.
+
+    WAV audio is cut on frame boundaries into segments that overlap by
+    `overlap_seconds`, so only one segment is held per consumer, and each
+    segment is normalized for speech. Containers that can't be split without
+    decoding are yielded whole, up to AUDIO_INLINE_MAX_BYTES; beyond that
+    AudioTooLargeError is raised before anything is read.
+    """
+    if stats is None:
+        stats = AudioStats()
+    head = stream.read(12)
+    stream.seek(0)
+    mime_type = sniff_mime_type(head)
+
+    if mime_type == "audio/wav":
+        try:
+            wav = wave.open(stream, "rb")
+        except (wave.Error, EOFError):
+            # e.g. WAVE_FORMAT_EXTENSIBLE headers; send the file as uploaded
+            stream.seek(0)
+        else:
+            with wav:
+                params = wav.getparams()
+                total = wav.getnframes()
+                segment = max(1, segment_seconds * params.framerate)
+                step = max(1, segment - overlap_seconds * params.framerate)
+
+                frame_size = params.sampwidth * params.nchannels
+                stats.input_bytes += total * frame_size
+
+                start = 0
+                while True:
+                    wav.setpos(start)
+                    audio = _segment_bytes(params, wav.readframes(segment))
+                    stats.output_bytes += len(audio)
+                    yield audio, mime_type
+                    if start + segment >= total:
+                        return
+                    start += step
+
+    size = stream.seek(0, io.SEEK_END)
+    stream.seek(0)
+    if size > AUDIO_INLINE_MAX_BYTES:
+        raise AudioTooLargeError(size, mime_type)
+    audio = stream.read()
+    stats.input_bytes += len(audio)
+    stats.output_bytes += len(audio)
+    yield audio, mime_type
+
+
+def merge_transcripts(previous: str, current: str, max_overlap_words: int = 40) -> str:
+    """Joins two consecutive segment transcripts, dropping the words both
+    segments heard in their overlapping audio."""
+    if not previous:
+        return current
+    if not current:
+        return previous
+
+    prev_words = previous.split()
+    curr_words = current.split()
+
+    def normalize(word):
+        return word.strip(".,!?;:\"'").lower()
+
+    for size in range(min(max_overlap_words, len(prev_words), len(curr_words)), 0, -1):
+        if [normalize(w) for w in prev_words[-size:]] == [normalize(w) for w in curr_words[:size]]:
+            return " ".join(prev_words + curr_words[size:])
+
+    return " ".join(prev_words + curr_words)
@@ -0,0 +1,114 @@
+from typing import Optional
+import hashlib
+import json
+import os
+from redis.exceptions import RedisError
+from app.utils.redis_config import get_redis
+from app.utils.lru_cache import LRUCache
+
+# Backend used for cached model results: "memory", "redis" or "tiered" (memory in front of redis)
+RESULT_CACHE_BACKEND = os.getenv("RESULT_CACHE_BACKEND", "memory")
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", 1024))
+RESULT_CACHE_TTL_SECONDS = int(os.getenv("RESULT_CACHE_TTL_SECONDS", 24 * 3600))
+
+
+def _normalize(value):
+    if isinstance(value, dict):
+        return {str(k).strip(): _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+
+def canonical_json(value) -> str:
+    return json.dumps(_normalize(value), sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+def content_key(*parts: str) -> str:
+    """sha256 over the given parts, used as a content-addressed cache key."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class MemoryCache:
+    """In-process LRU cache with a per-entry TTL."""
+
+    def __init__(self, max_entries: int = RESULT_CACHE_MAX_ENTRIES, ttl: int = RESULT_CACHE_TTL_SECONDS):
+        self._entries: LRUCache[str] = LRUCache(max_entries, ttl)
+
+    async def get(self, key: str) -> Optional[str]:
+        return self._entries.get(key)
+
+    async def set(self, key: str, value: str):
+        self._entries.set(key, value)
+
+
+class RedisCache:
+    """Redis-backed cache shared by every worker.
+
+    Entries expire after `ttl`; size-based eviction is left to the server's
+    maxmemory policy (e.g. allkeys-lru). Redis errors are treated as misses
+    so an unavailable cache never fails a request.
+    """
+
+    def __init__(self, namespace: str, ttl: int = RESULT_CACHE_TTL_SECONDS):
+        self.prefix = f"arziki:{namespace}:"
+        self.ttl = ttl
+
+    async def get(self, key: str) -> Optional[str]:
+        try:
+            value = await get_redis().get(self.prefix + key)
+        except RedisError as e:
+            print(f"Redis cache read failed: {e}")
+            return None
+        return value.decode("utf-8") if value is not None else None
+
+    async def set(self, key: str, value: str):
+        try:
+            await get_redis().set(self.prefix + key, value, ex=self.ttl)
+        except RedisError as e:
+            print(f"Redis cache write failed: {e}")
+
+
+class TieredCache:
+    """In-process LRU tier in front of a shared backend.
+
+    Reads check the local tier first and fill it from the backend on a hit;
+    writes go to both.
+    """
+
+    def __init__(self, front: MemoryCache, back: RedisCache):
+        self.front = front
+        self.back = back
+
+    async def get(self, key: str) -> Optional[str]:
+        value = await self.front.get(key)
+        if value is None:
+            value = await self.back.get(key)
+            if value is not None:
+                await self.front.set(key, value)
+        return value
+
+    async def set(self, key: str, value: str):
+        await self.front.set(key, value)
+        await self.back.set(key, value)
+
+
+def create_cache(
+    namespace: str,
+    backend: str = RESULT_CACHE_BACKEND,
+    max_entries: int = RESULT_CACHE_MAX_ENTRIES,
+    ttl: int = RESULT_CACHE_TTL_SECONDS,
+):
+    if backend == "redis":
+        return RedisCache(namespace, ttl=ttl)
+    if backend == "tiered":
+        return TieredCache(MemoryCache(max_entries=max_entries, ttl=ttl), RedisCache(namespace, ttl=ttl))
+    if backend == "memory":
+        return MemoryCache(max_entries=max_entries, ttl=ttl)
+    raise ValueError(f"Unknown cache backend: {backend}")
@@ -0,0 +1,94 @@
+from typing import List, Tuple
+import json
+import os
+import numpy as np
+
+# Days of demand the local engine forecasts
+DEMAND_HORIZON_DAYS = int(os.getenv("DEMAND_HORIZON_DAYS", 30))
+# Demand-to-stock ratios separating Low / Medium / High
+DEMAND_HIGH_RATIO = float(os.getenv("DEMAND_HIGH_RATIO", 1.0))
+DEMAND_LOW_RATIO = float(os.getenv("DEMAND_LOW_RATIO", 0.3))
+# Products whose ratio is this close to a threshold are left to the LLM in hybrid mode
+DEMAND_AMBIGUITY_MARGIN = float(os.getenv("DEMAND_AMBIGUITY_MARGIN", 0.1))
+
+LEVELS = np.array(["Low", "Medium", "High"])
+
+
+def _daily_velocity(product: dict) -> float:
+    """Units sold per day from whichever history field the product carries."""
+    if product.get("sales_velocity") is not None:
+        return float(product["sales_velocity"])
+    history = product.get("sales_history")
+    if history:
+        return float(sum(history)) / len(history)
+    if product.get("units_sold") is not None and product.get("days"):
+        return float(product["units_sold"]) / float(product["days"])
+    return np.nan
+
+
+def score_products(products: List[dict]) -> Tuple[List[dict], np.ndarray]:
+    """Scores the whole catalog in one vectorized pass.
+
+    Returns the predictions in the same shape the LLM produces, plus a mask of
+    products the local engine is unsure about: those without any sales history
+    and those whose demand/stock ratio sits near a level threshold.
+    """
+    count = len(products)
+    price = np.fromiter((p.get("price") or 0 for p in products), dtype=np.float64, count=count)
+    stock = np.fromiter((p.get("stock") or 0 for p in products), dtype=np.float64, count=count)
+    velocity = np.fromiter((_daily_velocity(p) for p in products), dtype=np.float64, count=count)
+
+    has_history = ~np.isnan(velocity)
+    demand = np.where(has_history, np.rint(velocity * DEMAND_HORIZON_DAYS), stock)
+    ratio = np.where(stock > 0, demand / np.maximum(stock, 1), np.where(demand > 0, np.inf, 0.0))
+
+    level = (ratio >= DEMAND_LOW_RATIO).astype(np.int8) + (ratio >= DEMAND_HIGH_RATIO)
+    near_threshold = (
+        (np.abs(ratio - DEMAND_HIGH_RATIO) < DEMAND_AMBIGUITY_MARGIN)
+        | (np.abs(ratio - DEMAND_LOW_RATIO) < DEMAND_AMBIGUITY_MARGIN)
+    )
+    ambiguous = ~has_history | near_threshold
+    # Without history nothing is known about demand, so don't claim a level
+    level = np.where(has_history, level, 1)
+
+    days_of_cover = np.where(velocity > 0, stock / np.where(velocity > 0, velocity, 1), np.inf)
+
+    # Build the response rows from plain lists; indexing numpy scalars per row is slow
+    rows = zip(
+        products,
+        price.tolist(),
+        stock.astype(np.int64).tolist(),
+        demand.astype(np.int64).tolist(),
+        LEVELS[level].tolist(),
+        has_history.tolist(),
+        velocity.tolist(),
+        days_of_cover.tolist(),
+    )
+    predictions = []
+    for product, p, s, d, lvl, known, v, cover in rows:
+        if known:
+            cover_text = f"{cover:.0f} days" if cover != np.inf else "indefinitely"
+            reasoning = (
+                f"Selling about {v:.1f} units/day; {s} in stock lasts "
+                f"{cover_text} against a {DEMAND_HORIZON_DAYS}-day horizon."
+            )
+        else:
+            reasoning = "No sales history supplied; demand assumed to match current stock."
+        predictions.append({
+            "category": product.get("category"),
+            "product_name": product.get("name", product.get("product_name")),
+            "price": p,
+            "current_stock": s,
+            "predicted_demand": d,
+            "demand_level": lvl,
+            "reasoning": reasoning,
+        })
+    return predictions, ambiguous
+
+
+def predict_demand_local(business_data: dict) -> str:
+    predictions, _ = score_products(business_data.get("products", []))
+    return json.dumps({
+        "business_name": business_data.get("business_name"),
+        "predictions": predictions,
+    })
@@ -0,0 +1,192 @@
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import heapq
+import itertools
+import time
+
+# Priority classes for model calls; chat and transcription are interactive,
+# report generation is batch
+INTERACTIVE = "interactive"
+BATCH = "batch"
+
+# (priority, user_id) of the work currently calling the model
+_caller: ContextVar[Tuple[str, Optional[str]]] = ContextVar("llm_caller", default=(INTERACTIVE, None))
+
+
+@contextmanager
+def llm_priority(priority: str, user_id: Optional[str] = None):
+    """Runs model calls made inside the block, including in tasks it starts,
+    under `priority` on behalf of `user_id`."""
+    token = _caller.set((priority, user_id))
+    try:
+        yield
+    finally:
+        _caller.reset(token)
+
+
+def current_caller() -> Tuple[str, Optional[str]]:
+    return _caller.get()
+
+
+class _ClassQueue:
+    """Waiters of one priority class, served fairly across users.
+
+    Each waiter is tagged with the virtual time at which its user's previous
+    requests will have been served (start-time fair queuing), so a user with
+    a long backlog cannot hold back another user's first request.
+    """
+
+    def __init__(self, weight: float):
+        self.weight = weight
+        self.pass_value = 0.0
+        self.dispatched = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self._heap: List[tuple] = []
+        self._vtime = 0.0
+        self._finish: Dict[Optional[str], float] = {}
+        self._seq = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def push(self, user_id: Optional[str], future: asyncio.Future):
+        start = max(self._vtime, self._finish.get(user_id, 0.0))
+        self._finish[user_id] = start + 1
+        heapq.heappush(self._heap, (start, next(self._seq), future))
+
+    def pop(self) -> Optional[asyncio.Future]:
+        while self._heap:
+            start, _, future = heapq.heappop(self._heap)
+            if future.cancelled():
+                continue
+            self._vtime = start
+            if len(self._finish) > 1024:
+                # Users served up to now have no backlog left to account for
+                self._finish = {user: tag for user, tag in self._finish.items() if tag > start}
+            return future
+        return None
+
+    def record_wait(self, seconds: float):
+        self.dispatched += 1
+        self.wait_seconds_total += seconds
+        self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+
+
+class _ModelQueue:
+    """Concurrency slots of one model, shared out between priority classes.
+
+    Classes are picked by stride scheduling on their weights: with both
+    backlogged, a class of weight 8 gets eight slots for every one a class of
+    weight 1 gets, and an idle class's share goes to the others.
+    """
+
+    def __init__(self, limit: int, weights: Dict[str, float]):
+        self.limit = limit
+        self.in_flight = 0
+        self._classes = {name: _ClassQueue(weight) for name, weight in weights.items()}
+        self._vtime = 0.0
+
+    def _class(self, priority: str) -> _ClassQueue:
+        try:
+            return self._classes[priority]
+        except KeyError:
+            raise ValueError(f"Unknown LLM priority: {priority}")
+
+    async def acquire(self, priority: str, user_id: Optional[str]):
+        queue = self._class(priority)
+        if self.in_flight < self.limit and not any(self._classes.values()):
+            self.in_flight += 1
+            queue.record_wait(0.0)
+            return
+
+        if not queue:
+            # An idle class starts from now rather than banking unused share
+            queue.pass_value = max(queue.pass_value, self._vtime)
+        future = asyncio.get_running_loop().create_future()
+        queue.push(user_id, future)
+        enqueued = time.monotonic()
+        # Slots may be free with only cancelled waiters ahead
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted just as the caller was cancelled; hand the slot on
+                self.release()
+            raise
+        queue.record_wait(time.monotonic() - enqueued)
+
+    def release(self):
+        self.in_flight -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        while self.in_flight < self.limit:
+            waiting = [queue for queue in self._classes.values() if queue]
+            if not waiting:
+                return
+            queue = min(waiting, key=lambda q: q.pass_value)
+            future = queue.pop()
+            if future is None:
+                continue
+            self._vtime = queue.pass_value
+            queue.pass_value += 1 / queue.weight
+            self.in_flight += 1
+            future.set_result(None)
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "classes": {
+                name: {
+                    "queued": len(queue),
+                    "dispatched": queue.dispatched,
+                    "wait_seconds_total": queue.wait_seconds_total,
+                    "wait_seconds_max": queue.wait_seconds_max,
+                }
+                for name, queue in self._classes.items()
+            },
+        }
+
+
+class LLMDispatcher:
+    """Central queue in front of every async model call.
+
+    Each model has its own concurrency cap. When a model is saturated,
+    waiting calls are released by priority class weight and, within a class,
+    fairly across users.
+    """
+
+    def __init__(self, limits: Dict[str, int], default_limit: int, weights: Dict[str, float]):
+        self.limits = limits
+        self.default_limit = default_limit
+        self.weights = weights
+        self._models: Dict[str, _ModelQueue] = {}
+
+    def _queue(self, model: str) -> _ModelQueue:
+        queue = self._models.get(model)
+        if queue is None:
+            limit = self.limits.get(model, self.default_limit)
+            queue = self._models.setdefault(model, _ModelQueue(limit, self.weights))
+        return queue
+
+    @asynccontextmanager
+    async def slot(self, model: str, priority: Optional[str] = None, user_id: Optional[str] = None):
+        """Holds one of `model`'s slots; priority and user default to the current caller."""
+        if priority is None:
+            priority, caller_id = current_caller()
+            user_id = user_id if user_id is not None else caller_id
+        queue = self._queue(model)
+        await queue.acquire(priority, user_id)
+        try:
+            yield
+        finally:
+            queue.release()
+
+    def stats(self) -> Dict[str, dict]:
+        """Slots, queue depth and wait times per model and priority class."""
+        return {model: queue.stats() for model, queue in self._models.items()}
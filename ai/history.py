@@ -0,0 +1,152 @@
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+import os
+from app.db.database import SessionLocal
+from app.db.models import ChatMessages
+from app.utils.lru_cache import LRUCache
+from app.utils.metrics_config import cache_hits, cache_misses, cache_evictions, cache_entries, cache_bytes
+
+# Prompt budget for the chat history sent with every turn. Tokens are
+# estimated from characters so the window never needs a tokenizer call.
+CHAT_HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", 8000))
+CHARS_PER_TOKEN = int(os.getenv("CHARS_PER_TOKEN", 4))
+
+# Per-process cache of conversation windows, rebuilt from ChatMessages on a miss
+CHAT_CACHE_MAX_USERS = int(os.getenv("CHAT_CACHE_MAX_USERS", 10000))
+CHAT_CACHE_MAX_BYTES = int(os.getenv("CHAT_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+CHAT_CACHE_TTL_SECONDS = float(os.getenv("CHAT_CACHE_TTL_SECONDS", 900))
+CHAT_HISTORY_REHYDRATE_TURNS = int(os.getenv("CHAT_HISTORY_REHYDRATE_TURNS", 50))
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _content(role: str, text: str) -> Dict:
+    return {"role": role, "parts": [{"text": text}]}
+
+
+class ConversationWindow:
+    """Most recent chat turns of one user, kept within a token budget.
+
+    The token count is maintained as turns are added and dropped, so the
+    history is never rescanned to decide what fits.
+    """
+
+    def __init__(self, token_budget: int = CHAT_HISTORY_TOKEN_BUDGET):
+        self.token_budget = token_budget
+        self.turns: Deque[Tuple[str, str, int]] = deque()
+        self.token_count = 0
+        self.char_count = 0
+
+    def __len__(self):
+        return len(self.turns)
+
+    def append(self, user_message: str, reply: str):
+        tokens = estimate_tokens(user_message) + estimate_tokens(reply)
+        self.turns.append((user_message, reply, tokens))
+        self.token_count += tokens
+        self.char_count += len(user_message) + len(reply)
+
+        # Drop whole turns from the front so the window always starts with a user message
+        while self.turns and self.token_count > self.token_budget:
+            message, dropped_reply, dropped = self.turns.popleft()
+            self.token_count -= dropped
+            self.char_count -= len(message) + len(dropped_reply)
+
+    def contents(self, user_message: str) -> List[Dict]:
+        """Multi-turn `contents` for the window followed by the new message."""
+        # Oldest turns that would push the prompt over budget are left out
+        overflow = self.token_count + estimate_tokens(user_message) - self.token_budget
+
+        contents = []
+        for message, reply, tokens in self.turns:
+            if overflow > 0:
+                overflow -= tokens
+                continue
+            contents.append(_content("user", message))
+            contents.append(_content("model", reply))
+
+        contents.append(_content("user", user_message))
+        return contents
+
+
+def load_window(user_id: str) -> ConversationWindow:
+    """Rebuilds a user's window from the latest saved ChatMessages rows."""
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(ChatMessages.message, ChatMessages.response)
+            .filter(ChatMessages.user_id == user_id)
+            .order_by(ChatMessages.timestamp.desc())
+            .limit(CHAT_HISTORY_REHYDRATE_TURNS)
+            .all()
+        )
+    finally:
+        db.close()
+
+    window = ConversationWindow()
+    for message, response in reversed(rows):
+        window.append(message, response or "")
+    return window
+
+
+class ConversationCache:
+    """LRU/TTL cache of conversation windows bounded by users and memory.
+
+    Memory is approximated by the characters held in each window. Entries
+    expire after `ttl` seconds so windows edited by another worker are
+    reloaded from the database. Lookups, evictions and size are exported
+    to Prometheus under cache=`name`.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[str], ConversationWindow] = load_window,
+        max_users: int = CHAT_CACHE_MAX_USERS,
+        max_bytes: int = CHAT_CACHE_MAX_BYTES,
+        ttl: float = CHAT_CACHE_TTL_SECONDS,
+        name: str = "conversation",
+    ):
+        self.loader = loader
+        self._hits = cache_hits.labels(cache=name)
+        self._misses = cache_misses.labels(cache=name)
+        self._entries: LRUCache[ConversationWindow] = LRUCache(
+            max_users, ttl, max_size=max_bytes, on_evict=cache_evictions.labels(cache=name).inc
+        )
+        self._lock = self._entries.lock
+        cache_entries.labels(cache=name).set_function(lambda: len(self._entries))
+        cache_bytes.labels(cache=name).set_function(lambda: self._entries.size)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, user_id: str) -> Optional[ConversationWindow]:
+        """Returns the cached window, or None when it must be loaded."""
+        window = self._entries.get(user_id)
+        if window is None:
+            self._misses.inc()
+        else:
+            self._hits.inc()
+        return window
+
+    def load(self, user_id: str) -> ConversationWindow:
+        window = self.loader(user_id)
+        with self._lock:
+            # Another request may have loaded the same user meanwhile
+            entry = self._entries.entry(user_id)
+            if entry is not None:
+                return entry[0]
+            self._entries.set(user_id, window, size=window.char_count)
+        return window
+
+    def record(self, user_id: str, window: ConversationWindow, user_message: str, reply: str):
+        """Appends a turn to `window` and re-accounts its size."""
+        with self._lock:
+            window.append(user_message, reply)
+            entry = self._entries.entry(user_id)
+            if entry is not None and entry[0] is window:
+                self._entries.set(user_id, window, size=window.char_count, expires=entry[1])
+
+    def invalidate(self, user_id: str):
+        self._entries.pop(user_id)
@@ -2,70 +2,212 @@ from google import genai
 from google.genai import types
 from dotenv import load_dotenv
 import os
-from typing import Dict, List
+import asyncio
+from contextlib import aclosing
+from typing import AsyncIterator, BinaryIO, Dict, List, Optional, Tuple, Union
 from google import genai
+import hashlib
 import json
 import re
+import threading
+import uuid
+import httpx
 from google.oauth2 import service_account
+from ai.history import ConversationCache, ConversationWindow
+from ai.cache import canonical_json, content_key, create_cache, RESULT_CACHE_BACKEND
+from ai.demand_engine import predict_demand_local, score_products
+from ai.audio import (AudioStats, AudioTooLargeError, AUDIO_NORMALIZE, AUDIO_TARGET_RATE,
+                      iter_segments, merge_transcripts)
+from ai.dispatch import LLMDispatcher, INTERACTIVE, BATCH, llm_priority
+from app.utils.cloud_storage_config import upload_fileobj, delete_blob
+from app.core.config import STORAGE_BACKEND, CLOUD_BUCKET_NAME, TRANSCRIBE_STAGING_BUCKET, parse_env_map
+from app.utils.metrics_config import (llm_seconds, llm_errors, llm_in_flight,
+                                      cache_hits, cache_misses, cache_bytes_saved,
+                                      record_usage, register_llm_queue, track)
 
 # Load .env file
 load_dotenv()
 
 PROJECT_ID = "arziki"  # replace with your project ID
 LOCATION = "us-central1"
+CHAT_MODEL = "gemini-2.0-flash"
+DEMAND_MODEL = "gemini-2.5-pro"
+TRANSCRIBE_MODEL = "gemini-2.0-flash"
+# Bump whenever the demand prompt changes so cached predictions are not reused
+DEMAND_PROMPT_VERSION = "2"
+
+# Large catalogs are split into chunks of at most this many products / characters
+DEMAND_CHUNK_SIZE = int(os.getenv("DEMAND_CHUNK_SIZE", 50))
+DEMAND_CHUNK_MAX_CHARS = int(os.getenv("DEMAND_CHUNK_MAX_CHARS", 20000))
+DEMAND_CHUNK_PARALLELISM = int(os.getenv("DEMAND_CHUNK_PARALLELISM", 4))
+DEMAND_CHUNK_RETRIES = int(os.getenv("DEMAND_CHUNK_RETRIES", 2))
+
+# Audio segments transcribed concurrently per upload
+TRANSCRIBE_WORKERS = int(os.getenv("TRANSCRIBE_WORKERS", 4))
+
+# Transcripts of previously seen audio, keyed by a hash of the uploaded bytes
+TRANSCRIPT_CACHE_BACKEND = os.getenv("TRANSCRIPT_CACHE_BACKEND", RESULT_CACHE_BACKEND)
+TRANSCRIPT_CACHE_TTL_SECONDS = int(os.getenv("TRANSCRIPT_CACHE_TTL_SECONDS", 7 * 24 * 3600))
+AUDIO_HASH_CHUNK_SIZE = 1024 * 1024
+# Uploads too large to send inline are staged under this prefix of TRANSCRIBE_STAGING_BUCKET
+TRANSCRIBE_STAGING_PREFIX = os.getenv("TRANSCRIBE_STAGING_PREFIX", "transcribe-staging/")
+
+# Connection pool shared by every request made through the GenAI clients
+GENAI_MAX_CONNECTIONS = int(os.getenv("GENAI_MAX_CONNECTIONS", 100))
+GENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("GENAI_MAX_KEEPALIVE_CONNECTIONS", 20))
+GENAI_KEEPALIVE_EXPIRY = float(os.getenv("GENAI_KEEPALIVE_EXPIRY", 60))
+
+# Max in-flight async calls per model, e.g. GENAI_MODEL_CONCURRENCY="gemini-2.5-pro=4,gemini-2.0-flash=32"
+GENAI_DEFAULT_CONCURRENCY = int(os.getenv("GENAI_DEFAULT_CONCURRENCY", 16))
+GENAI_MODEL_CONCURRENCY = parse_env_map("GENAI_MODEL_CONCURRENCY", int)
+
+# Share of a saturated model's slots per priority class, e.g. LLM_PRIORITY_WEIGHTS="interactive=8,batch=1"
+LLM_PRIORITY_WEIGHTS = {
+    INTERACTIVE: 8.0,
+    BATCH: 1.0,
+    **parse_env_map("LLM_PRIORITY_WEIGHTS", float),
+}
 
 
 # --- Store history per user ---
-user_histories: Dict[str, List[Dict[str, str]]] = {}
+user_histories = ConversationCache()
+
+# --- Demand predictions keyed by the content of the business data ---
+prediction_cache = create_cache("prediction")
+
+# --- Transcripts keyed by the audio content ---
+transcript_cache = create_cache("transcript", backend=TRANSCRIPT_CACHE_BACKEND, ttl=TRANSCRIPT_CACHE_TTL_SECONDS)
 
 
 # --- Google GenAI Client ---
-def create_client():
-    client = genai.Client(
-        vertexai={
-            "project": PROJECT_ID,
-            "location": LOCATION
-        }
+# One client per (project, location), created on first use and reused by
+# every call so credentials are resolved once and connections are kept alive.
+_clients: Dict[tuple, genai.Client] = {}
+_clients_lock = threading.Lock()
+
+
+def _http_options() -> types.HttpOptions:
+    limits = httpx.Limits(
+        max_connections=GENAI_MAX_CONNECTIONS,
+        max_keepalive_connections=GENAI_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=GENAI_KEEPALIVE_EXPIRY,
     )
+    return types.HttpOptions(
+        client_args={"limits": limits},
+        async_client_args={"limits": limits},
+    )
+
+
+def get_client(project: str = PROJECT_ID, location: str = LOCATION) -> genai.Client:
+    key = (project, location)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = genai.Client(
+                    vertexai=True,
+                    project=project,
+                    location=location,
+                    http_options=_http_options(),
+                )
+                _clients[key] = client
     return client
 
-def generate_reply(user_id: str, user_message: str) -> str:
-    history = user_histories.get(user_id, [])
 
-    client = create_client()
+def create_client():
+    return get_client()
 
-    # Build a single prompt string including history
-    prompt_text = ""
-    for msg in history:
-        if msg["role"] == "user":
-            prompt_text += f"User: {msg['content']}\n"
-        else:
-            prompt_text += f"Bot: {msg['content']}\n"
 
-    prompt_text += f"User: {user_message}\nBot:"
+# Every async model call waits its turn here; see ai/dispatch.py
+llm_dispatcher = LLMDispatcher(GENAI_MODEL_CONCURRENCY, GENAI_DEFAULT_CONCURRENCY, LLM_PRIORITY_WEIGHTS)
 
-    # Call Gemini 2.0
-    response = client.models.generate_content(
-        model="gemini-2.0-flash",
-        contents=prompt_text
-    )
 
-    bot_reply = response.text.strip()
+async def _generate_async(operation: str, **request):
+    """Runs generate_content on the async client once the dispatcher grants a slot.
 
-    # Update history for this user
-    history.append({"role": "user", "content": user_message})
-    history.append({"role": "model", "content": bot_reply})
-    user_histories[user_id] = history
+    The call is queued under the priority and user set by `llm_priority`;
+    only the call itself is timed, queue waits are exported by the dispatcher.
+    """
+    async with llm_dispatcher.slot(request["model"]):
+        with track(llm_seconds, llm_errors, llm_in_flight, model=request["model"], operation=operation):
+            response = await get_client().aio.models.generate_content(**request)
+    record_usage(request["model"], response.usage_metadata)
+    return response
 
-    return bot_reply
+
+def llm_queue_stats() -> Dict[str, dict]:
+    return llm_dispatcher.stats()
+
+
+register_llm_queue(llm_queue_stats)
 
 
-def predict_demand_v2(input_json: str) -> str:
-    # 1. Initialize the new unified Client
-    # Setting vertexai=True tells it to use your GCP Project credits/quota
-    client = genai.Client(vertexai=True, project=PROJECT_ID, location=LOCATION)
+async def close_clients():
+    """Closes the sync and async transports of every pooled client."""
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
 
-    # 3. Define the Prompt
+    for client in clients:
+        await client.aio.aclose()
+        client.close()
+
+async def _history_for_async(user_id: str) -> ConversationWindow:
+    history = user_histories.get(user_id)
+    if history is None:
+        # Rehydrating runs a DB query, keep it off the event loop
+        history = await asyncio.to_thread(user_histories.load, user_id)
+    return history
+
+
+async def generate_reply_async(user_id: str, user_message: str) -> str:
+    history = await _history_for_async(user_id)
+
+    with llm_priority(INTERACTIVE, user_id):
+        response = await _generate_async(
+            "chat",
+            model=CHAT_MODEL,
+            contents=history.contents(user_message)
+        )
+
+    bot_reply = response.text.strip()
+    user_histories.record(user_id, history, user_message, bot_reply)
+
+    return bot_reply
+
+
+async def stream_reply_async(user_id: str, user_message: str) -> AsyncIterator[str]:
+    """Yields reply text as Gemini produces it.
+
+    The turn is added to the history only once the stream completes; if the
+    consumer stops early the upstream stream is closed and nothing is recorded.
+    """
+    history = await _history_for_async(user_id)
+
+    chunks = []
+    usage_metadata = None
+    async with llm_dispatcher.slot(CHAT_MODEL, INTERACTIVE, user_id):
+        with track(llm_seconds, llm_errors, llm_in_flight, model=CHAT_MODEL, operation="chat_stream"):
+            stream = await get_client().aio.models.generate_content_stream(
+                model=CHAT_MODEL,
+                contents=history.contents(user_message)
+            )
+            async with aclosing(stream):
+                async for chunk in stream:
+                    # Running totals; the last chunk carries the final counts
+                    usage_metadata = chunk.usage_metadata or usage_metadata
+                    if chunk.text:
+                        chunks.append(chunk.text)
+                        yield chunk.text
+    record_usage(CHAT_MODEL, usage_metadata)
+
+    bot_reply = "".join(chunks).strip()
+    user_histories.record(user_id, history, user_message, bot_reply)
+
+
+def _build_demand_request(input_json: str) -> dict:
+    # Define the Prompt
     prompt_text = f"""
 You are an expert retail analyst. Analyze the business data below.
 For each product, predict 'demand_level' (High, Medium, Low) and provide 'reasoning'.
@@ -89,13 +231,9 @@ Data:
 {input_json}
 """
 
-
-    # 4. Generate Content with JSON enforcement
     # The new SDK makes it very easy to enforce JSON output using 'response_mime_type'
-    print("Sending data to Gemini (via google-genai SDK)...")
-    
-    response = client.models.generate_content(
-        model="gemini-2.5-pro",  # Using the latest stable model
+    return dict(
+        model=DEMAND_MODEL,  # Using the latest stable model
         contents=[
         {
             "role": "user",
@@ -107,80 +245,319 @@ Data:
             temperature=0.2
         )
     )
-    print(response.text, "\n --- End of Gemini Response ---\n")
-    
+
+
+async def predict_demand_v2_async(input_json: str) -> str:
+    response = await _generate_async("demand", **_build_demand_request(input_json))
     return response.text
 
 
-def generate_report_html(prediction_json: dict, model_name='gemini-2.5-flash'):
-    client = create_client()
+def _chunk_products(products: List[dict]) -> List[List[dict]]:
+    chunks, current, current_chars = [], [], 0
+    for product in products:
+        size = len(json.dumps(product))
+        if current and (len(current) >= DEMAND_CHUNK_SIZE or current_chars + size > DEMAND_CHUNK_MAX_CHARS):
+            chunks.append(current)
+            current, current_chars = [], 0
+        current.append(product)
+        current_chars += size
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+async def _predict_chunk(business_data: dict, products: List[dict], semaphore: asyncio.Semaphore) -> str:
+    chunk_data = dict(business_data, products=products)
+    for attempt in range(DEMAND_CHUNK_RETRIES + 1):
+        try:
+            async with semaphore:
+                prediction = await predict_demand_v2_async(chunk_data)
+            json.loads(prediction)
+            return prediction
+        except Exception as e:
+            # Only this chunk is retried; the others keep their results
+            if attempt == DEMAND_CHUNK_RETRIES:
+                raise
+            print(f"Demand chunk of {len(products)} products failed ({e}), retrying...")
+            await asyncio.sleep(2 ** attempt)
+
+
+async def predict_demand_chunked(business_data: dict) -> str:
+    """Predicts demand for large catalogs by fanning chunks out concurrently.
+
+    The per-chunk predictions are merged back into the usual
+    {business_name, predictions} document.
+    """
+    semaphore = asyncio.Semaphore(DEMAND_CHUNK_PARALLELISM)
+    chunks = _chunk_products(business_data.get("products", []))
+    if len(chunks) <= 1:
+        return await _predict_chunk(business_data, business_data.get("products", []), semaphore)
+
+    tasks = [asyncio.create_task(_predict_chunk(business_data, chunk, semaphore)) for chunk in chunks]
+    try:
+        results = await asyncio.gather(*tasks)
+    except BaseException:
+        # One failed chunk fails the prediction; don't keep paying for the others
+        for task in tasks:
+            task.cancel()
+        raise
+
+    return json.dumps({
+        "business_name": business_data.get("business_name"),
+        "predictions": [
+            prediction
+            for result in results
+            for prediction in json.loads(result).get("predictions", [])
+        ],
+    })
+
+
+async def predict_demand_hybrid(business_data: dict) -> str:
+    """Scores the catalog locally and asks Gemini only about ambiguous products."""
+    products = business_data.get("products", [])
+    predictions, ambiguous = await asyncio.to_thread(score_products, products)
+
+    unsure = [i for i, flag in enumerate(ambiguous) if flag]
+    if unsure:
+        llm_prediction = json.loads(
+            await predict_demand_chunked(dict(business_data, products=[products[i] for i in unsure]))
+        )
+        by_name = {p.get("product_name"): p for p in llm_prediction.get("predictions", [])}
+        for i in unsure:
+            predictions[i] = by_name.get(predictions[i]["product_name"], predictions[i])
+
+    return json.dumps({
+        "business_name": business_data.get("business_name"),
+        "predictions": predictions,
+    })
+
+
+DEMAND_ENGINES = ("local", "llm", "hybrid")
+
 
+async def predict_demand_cached(business_data: dict, engine: str = "llm") -> Tuple[str, bool]:
+    """Returns (prediction, cache_hit), calling Gemini only on a miss.
 
-    # Convert the combined data to a clean JSON string for the prompt
-    analysis_data_str = json.dumps(prediction_json, indent=2)
+    `engine` selects the local NumPy scorer, the LLM, or the hybrid of both.
+    Local scoring is cheaper than a cache lookup and is never cached.
+    """
+    if engine == "local":
+        return await asyncio.to_thread(predict_demand_local, business_data), False
+
+    key = content_key(engine, DEMAND_MODEL, DEMAND_PROMPT_VERSION, canonical_json(business_data))
+
+    prediction = await prediction_cache.get(key)
+    if prediction is not None:
+        return prediction, True
+
+    if engine == "hybrid":
+        prediction = await predict_demand_hybrid(business_data)
+    else:
+        prediction = await predict_demand_chunked(business_data)
+    await prediction_cache.set(key, prediction)
+    return prediction, False
+
+
+def _build_narrative_request(prediction_json: dict, model_name: str) -> dict:
+    # Only the fields the narrative needs, serialized compactly to save input tokens
+    products = [
+        {
+            "name": p.get("product_name"),
+            "level": p.get("demand_level"),
+            "demand": p.get("predicted_demand"),
+            "stock": p.get("current_stock"),
+            "why": p.get("reasoning"),
+        }
+        for p in prediction_json.get("predictions", [])
+    ]
+    data = json.dumps({"business_name": prediction_json.get("business_name"), "products": products},
+                      separators=(",", ":"))
 
     prompt = f"""
-You are a Professional Report Formatting Engine. Convert the data below into a complete HTML document.
-
-1. Role: Act as a professional analyst. Interpret the data to create a narrative for the report, focusing on market demand, supply (stock levels), and strategic insights.
-2. Output Format: The output MUST be a single, complete HTML document. It must start exactly with <!DOCTYPE html> and end with </html>. Do not include any conversational text, markdown formatting, or explanations outside of the HTML structure.
-3. Styling: All CSS must be internal, placed within a <style> tag in the <head> section. Design for a clean, modern, and professional aesthetic suitable for a corporate PDF report. Use a professional color palette (e.g., shades of blue, gray, and white), clear typography (e.g., sans-serif fonts like Arial or Helvetica), and appropriate spacing.
-4. Report Structure: The HTML body must be structured as follows:
-5. Main Title: An <h1> element containing the report title, dynamically using the business name (e.g., "Market Demand & Supply Analysis for [Business Name]").
-6. Executive Summary: An <h2> for "Executive Summary". Below it, write a 2-3 paragraph summary that synthesizes the key findings. Mention the overall demand landscape (e.g., "The analysis reveals a mixed demand landscape...") and highlight the most significant product opportunities or risks based on the demand_level and reasoning fields.
-7. Business Profile: An <h2> for "Business Profile". Display the business metadata (Industry, Location, Size) in a clear, easy-to-read format, such as an unordered list (<ul>) or a definition list (<dl>).
-8. Detailed Product Analysis: An <h2> for "Detailed Product Analysis". Present the product data in a well-structured HTML <table>.
-9. Table Headers (<thead>): The table must have columns for: "Product Name", "Category", "Price", "Current Stock", "Predicted Demand", and "Analyst Reasoning".
-10. Table Body (<tbody>): Each product from the JSON data should be a row (<tr>) in the table.
-11. Visual Indicators: In the "Predicted Demand" cell, use the text but also consider adding a subtle visual cue with CSS. For example, you could style the cell's background color based on the demand level (e.g., light green for 'High', light yellow for 'Medium', light red for 'Low').
-12. Strategic Recommendations: An <h2> for "Strategic Recommendations". Based on the analysis, provide 2-3 actionable recommendations in a bulleted list (<ul>). For example:
-13. For "High" demand products: "Prioritize restocking and consider marketing campaigns to capitalize on strong demand."
-14. For "Medium" demand products: "Maintain current stock levels and monitor sales trends closely."
-15. For "Low" demand products: "Consider promotional pricing or bundling to clear excess inventory."
-16. AT the end create a footer contain the business name and "powered by Arziki Analytics"."
+You are a professional retail analyst writing the narrative for a demand report. The tables are produced separately.
+Return ONLY JSON of the form {{"executive_summary": ["paragraph", ...], "recommendations": ["recommendation", ...]}}.
+- executive_summary: 2-3 short paragraphs on the overall demand landscape, naming the most significant opportunities and risks.
+- recommendations: 2-3 actionable recommendations (restock High demand, monitor Medium, promote or bundle Low).
 
 DATA:
-{analysis_data_str}
+{data}
 """
 
-    response = client.models.generate_content(
+    return dict(
         model=model_name,
         contents=[{
             "role": "user",
-            "parts": [{"text": prompt.replace("\\n", "")}]
+            "parts": [{"text": prompt}]
         }],
-        config=types.GenerateContentConfig(temperature=0.1)
+        config=types.GenerateContentConfig(
+            response_mime_type="application/json",
+            temperature=0.1
+        )
     )
 
-    print("Generated HTML Report Content:\n", response.text)
-    return response.text.strip()
-
 
-def transcribe_audio(audio_path: str):
-    client = create_client()
-
-    audio_bytes = open(audio_path, "rb").read()
-
-    response = client.models.generate_content(
-        model="gemini-2.0-flash",
+def _as_paragraphs(value) -> List[str]:
+    # The template loops over these; a bare string would render one character per paragraph
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, list):
+        return []
+    return [item.strip() for item in value if isinstance(item, str) and item.strip()]
+
+
+async def generate_report_narrative_async(prediction_json: dict, model_name='gemini-2.5-flash') -> dict:
+    """Asks the model only for the report's prose; layout is rendered locally."""
+    response = await _generate_async("narrative", **_build_narrative_request(prediction_json, model_name))
+
+    try:
+        narrative = json.loads(response.text)
+    except ValueError:
+        narrative = {"executive_summary": response.text}
+    if not isinstance(narrative, dict):
+        narrative = {}
+    return {
+        "executive_summary": _as_paragraphs(narrative.get("executive_summary")),
+        "recommendations": _as_paragraphs(narrative.get("recommendations")),
+    }
+
+
+def _build_transcription_request(audio_bytes: Optional[bytes], mime_type: str = "audio/wav",
+                                 file_uri: Optional[str] = None) -> dict:
+    if file_uri is not None:
+        audio = types.Part.from_uri(file_uri=file_uri, mime_type=mime_type)
+    else:
+        audio = types.Part.from_bytes(data=audio_bytes, mime_type=mime_type)
+    return dict(
+        model=TRANSCRIBE_MODEL,
         contents=[
-            types.Part.from_bytes(audio_bytes, mime_type="audio/wav")
+            "Transcribe the speech in this audio verbatim. Return only the transcript.",
+            audio
         ],
         config=types.GenerateContentConfig(
             temperature=0.0,
         )
     )
 
+
+async def _transcribe_segment(audio_bytes: bytes, mime_type: str, semaphore: asyncio.Semaphore) -> str:
+    try:
+        response = await _generate_async("transcribe", **_build_transcription_request(audio_bytes, mime_type))
+        return response.text.strip()
+    finally:
+        semaphore.release()
+
+
+async def transcribe_stream_async(stream: BinaryIO, stats: Optional[AudioStats] = None) -> str:
+    """Transcribes an audio stream segment by segment, in parallel.
+
+    At most TRANSCRIBE_WORKERS segments are read and in flight at once, so
+    memory stays bounded however long the recording is. Transcripts are
+    stitched back together in order.
+    """
+    semaphore = asyncio.Semaphore(TRANSCRIBE_WORKERS)
+    segments = iter_segments(stream, stats=stats)
+    tasks = []
+    try:
+        while True:
+            await semaphore.acquire()
+            segment = await asyncio.to_thread(next, segments, None)
+            if segment is None:
+                semaphore.release()
+                break
+            tasks.append(asyncio.create_task(_transcribe_segment(*segment, semaphore)))
+
+        transcripts = await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+    transcript = ""
+    for text in transcripts:
+        transcript = merge_transcripts(transcript, text)
+    return transcript
+
+
+async def transcribe_staged_async(stream: BinaryIO, error: AudioTooLargeError,
+                                  stats: Optional[AudioStats] = None) -> str:
+    """Transcribes audio too large to send inline by staging it in Cloud Storage.
+
+    Vertex reads the file from its gs:// URI, so the upload is streamed from
+    disk and never held in memory. Recordings only ever go to the private
+    TRANSCRIBE_STAGING_BUCKET, whose lifecycle rule removes anything a
+    failed delete leaves behind; without it `error` is re-raised.
+    """
+    bucket = TRANSCRIBE_STAGING_BUCKET
+    if STORAGE_BACKEND != "gcs" or not bucket or bucket == CLOUD_BUCKET_NAME:
+        raise error
+
+    blob_name = f"{TRANSCRIBE_STAGING_PREFIX}{uuid.uuid4()}"
+    stream.seek(0)
+    try:
+        await asyncio.to_thread(upload_fileobj, bucket, stream, blob_name,
+                                content_type=error.mime_type, size=error.size)
+        response = await _generate_async("transcribe", **_build_transcription_request(
+            None, error.mime_type, file_uri=f"gs://{bucket}/{blob_name}"))
+    finally:
+        try:
+            await asyncio.to_thread(delete_blob, bucket, blob_name)
+        except Exception as e:
+            print(f"Could not delete staged audio {bucket}/{blob_name}: {e}")
+
+    if stats is not None:
+        stats.input_bytes += error.size
+        stats.output_bytes += error.size
     return response.text.strip()
 
 
+def hash_audio(stream: BinaryIO) -> Tuple[str, int]:
+    """Returns (sha256, size) of the stream, read in bounded chunks."""
+    digest = hashlib.sha256()
+    size = 0
+    stream.seek(0)
+    for chunk in iter(lambda: stream.read(AUDIO_HASH_CHUNK_SIZE), b""):
+        digest.update(chunk)
+        size += len(chunk)
+    stream.seek(0)
+    return digest.hexdigest(), size
+
+
+async def transcribe_cached_async(stream: BinaryIO, stats: Optional[AudioStats] = None) -> Tuple[str, bool]:
+    """Returns (transcript, cache_hit); repeated uploads skip the model call."""
+    audio_hash, size = await asyncio.to_thread(hash_audio, stream)
+    # Normalization settings change what the model hears, so they are part of the key
+    key = content_key(TRANSCRIBE_MODEL, str(AUDIO_NORMALIZE), str(AUDIO_TARGET_RATE), audio_hash)
+
+    transcript = await transcript_cache.get(key)
+    if transcript is not None:
+        cache_hits.labels(cache="transcript").inc()
+        cache_bytes_saved.labels(cache="transcript").inc(size)
+        if stats is not None:
+            stats.input_bytes += size
+        return transcript, True
+
+    cache_misses.labels(cache="transcript").inc()
+    try:
+        transcript = await transcribe_stream_async(stream, stats)
+    except AudioTooLargeError as e:
+        transcript = await transcribe_staged_async(stream, e, stats)
+    if transcript:
+        await transcript_cache.set(key, transcript)
+    return transcript, False
+
+
+async def transcribe_audio_async(audio: Union[str, BinaryIO], stats: Optional[AudioStats] = None):
+    if isinstance(audio, str):
+        with open(audio, "rb") as f:
+            return (await transcribe_cached_async(f, stats))[0]
+    return (await transcribe_cached_async(audio, stats))[0]
+
+
 
-# Full pipeline
-def process_audio(user_id, audio_path):
-    transcript = transcribe_audio(audio_path)
-    print("Transcript:", transcript)
+async def process_audio_async(user_id, audio, stats: Optional[AudioStats] = None):
+    with llm_priority(INTERACTIVE, user_id):
+        transcript = await transcribe_audio_async(audio, stats)
 
-    reply = generate_reply(user_id, transcript)
-    print("Gemini Reply:", reply)
+    reply = await generate_reply_async(user_id, transcript)
 
     return reply, transcript
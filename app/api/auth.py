@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException, Depends
 from app.services.auth import (create_user, 
                            login, 
+                           logout,
                            verify_user, 
                            send_veification_mail, 
                            send_forgot_password_mail, 
@@ -20,6 +21,8 @@ router.post("/register", status_code=201)(create_user)
 
 router.post("/login", status_code=201)(login)
 
+router.post("/logout", status_code=200)(logout)
+
 router.post("/send-verification-email/{username}", status_code=201)(send_veification_mail)
 
 router.get("/verify/", status_code=200)(verify_user)
@@ -3,6 +3,10 @@ from app.services.chat import (chat_with_ai,
                            get_chat_history,
                            transcribe_audio_file,
                            generate_analytics_report,
+                           get_report_job,
+                           chat_admission,
+                           audio_admission,
+                           analytics_admission,
                         )
 
 router = APIRouter(
@@ -11,10 +15,12 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
-router.post("/message", status_code=200)(chat_with_ai)
+router.post("/message", status_code=200, dependencies=[Depends(chat_admission)])(chat_with_ai)
 
 router.get("/history", status_code=200)(get_chat_history)
 
-router.post("/audio", status_code=200)(transcribe_audio_file)
+router.post("/audio", status_code=200, dependencies=[Depends(audio_admission)])(transcribe_audio_file)
 
-router.post("/analytics", status_code=200)(generate_analytics_report)
+router.post("/analytics", status_code=202, dependencies=[Depends(analytics_admission)])(generate_analytics_report)
+
+router.get("/analytics/{job_id}", status_code=200)(get_report_job)
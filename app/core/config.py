@@ -3,11 +3,30 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+
+def parse_env_map(name: str, cast=str) -> dict:
+    """Reads a "key=value,key=value" variable into a dict, casting each value."""
+    return {
+        key.strip(): cast(value.strip())
+        for key, value in (
+            item.split("=", 1) for item in os.getenv(name, "").split(",") if "=" in item
+        )
+    }
+
+
 PAYSTACK_SECRET = os.getenv("PAYSTACK_SECRET_KEY", "sk_test_...")
 PAYSTACK_BASE_URL = os.getenv("PAYSTACK_BASE_URL", "https://api.paystack.co")
 
 
 SQL_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./test.db")
+# Derived from DATABASE_URL (aiosqlite / asyncpg) unless set explicitly
+ASYNC_SQL_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("true", "1", "t")
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() in ("true", "1", "t")
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES")
@@ -17,6 +36,11 @@ ACCESS_TOKEN_EXPIRE_MINUTES = os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES")
 CLOUD_BUCKET_NAME = os.getenv("CLOUD_BUCKET_NAME")
 CLOUD_PROJECT_ID = os.getenv("CLOUD_PROJECT_ID")
 CLOUD_SERVICE_ACCOUNT = os.getenv("CLOUD_SERVICE_ACCOUNT")
+# Private bucket for voice uploads too large to send to Gemini inline. Keep it
+# apart from CLOUD_BUCKET_NAME (whose objects are linked publicly), readable only
+# by the service account, with a lifecycle rule deleting objects after a day.
+# Unset, such uploads are refused.
+TRANSCRIBE_STAGING_BUCKET = os.getenv("TRANSCRIBE_STAGING_BUCKET")
 
 ## Email Configuration
 ZOHO_EMAIL = os.getenv("ZOHO_MAIL")
@@ -29,6 +53,19 @@ MAIL_SSL = False
 USE_CREDENTIALS = True
 VALIDATE_CERTS = True
 
+## Mail Outbox Configuration
+# Queued mail is sent in batches, each worker reusing its own authenticated SMTP session
+MAIL_SMTP_CONNECTIONS = int(os.getenv("MAIL_SMTP_CONNECTIONS", 4))
+MAIL_BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", 20))
+MAIL_POLL_SECONDS = float(os.getenv("MAIL_POLL_SECONDS", 5))
+MAIL_MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", 6))
+MAIL_RETRY_BASE_SECONDS = float(os.getenv("MAIL_RETRY_BASE_SECONDS", 10))
+MAIL_RETRY_MAX_SECONDS = float(os.getenv("MAIL_RETRY_MAX_SECONDS", 1800))
+MAIL_SENDING_STALE_SECONDS = int(os.getenv("MAIL_SENDING_STALE_SECONDS", 300))
+MAIL_SMTP_TIMEOUT = float(os.getenv("MAIL_SMTP_TIMEOUT", 30))
+# Servers drop idle sessions, so ours is closed first and reopened on demand
+MAIL_SMTP_IDLE_SECONDS = float(os.getenv("MAIL_SMTP_IDLE_SECONDS", 60))
+
 
 ML_MODEL_URL = os.getenv("ML_MODEL_URL")
 ML_MODEL_TOKEN = os.getenv("ML_MODEL_TOKEN")
@@ -36,4 +73,65 @@ ML_MODEL_TOKEN = os.getenv("ML_MODEL_TOKEN")
 
 GOOGLE_APPLICATION_CREDENTIALS_JSON = os.getenv("GOOGLE_APPLICATION_CREDENTIALS_JSON")
 
-CONVERT_API_SECRET = os.getenv("CONVERTAPI_SECRET")
\ No newline at end of file
+CONVERT_API_SECRET = os.getenv("CONVERTAPI_SECRET")
+
+## PDF Configuration
+PDF_BACKEND = os.getenv("PDF_BACKEND", "chromium")  # chromium or convertapi
+PDF_POOL_SIZE = int(os.getenv("PDF_POOL_SIZE", 2))
+PDF_CONTEXT_MAX_RENDERS = int(os.getenv("PDF_CONTEXT_MAX_RENDERS", 50))
+# A render waiting longer than this for a free context fails instead of hanging
+PDF_ACQUIRE_TIMEOUT_SECONDS = float(os.getenv("PDF_ACQUIRE_TIMEOUT_SECONDS", 120))
+
+## Redis Configuration
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+
+## Report Job Configuration
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", 2))
+REPORT_POLL_SECONDS = float(os.getenv("REPORT_POLL_SECONDS", 5))
+REPORT_JOB_STALE_SECONDS = int(os.getenv("REPORT_JOB_STALE_SECONDS", 900))
+
+## User Cache Configuration
+# Resolved users are reused for this long; updates and deletes invalidate them straight away
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", 30))
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", 10000))
+
+## Token Configuration
+# Verified claims are reused until the token expires
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", 10000))
+TOKEN_REVOCATION_BACKEND = os.getenv("TOKEN_REVOCATION_BACKEND", "redis")  # redis or memory
+TOKEN_REVOCATION_RETRY_SECONDS = float(os.getenv("TOKEN_REVOCATION_RETRY_SECONDS", 5))
+
+## Password Hashing Configuration
+# Changing a cost parameter upgrades each user's hash on their next login
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", 3))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", 65536))  # KiB
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", 4))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1)))
+
+## Admission Control Configuration
+# Per-user token buckets on the LLM-backed chat endpoints: sustained requests per minute and burst size
+ADMISSION_BACKEND = os.getenv("ADMISSION_BACKEND", "memory")  # memory or redis
+CHAT_RATE_PER_MINUTE = float(os.getenv("CHAT_RATE_PER_MINUTE", 20))
+CHAT_RATE_BURST = int(os.getenv("CHAT_RATE_BURST", 10))
+AUDIO_RATE_PER_MINUTE = float(os.getenv("AUDIO_RATE_PER_MINUTE", 6))
+AUDIO_RATE_BURST = int(os.getenv("AUDIO_RATE_BURST", 3))
+ANALYTICS_RATE_PER_MINUTE = float(os.getenv("ANALYTICS_RATE_PER_MINUTE", 1))
+ANALYTICS_RATE_BURST = int(os.getenv("ANALYTICS_RATE_BURST", 3))
+ADMISSION_MAX_BUCKETS = int(os.getenv("ADMISSION_MAX_BUCKETS", 10000))
+# Max admitted requests in flight per model in each process, e.g. "gemini-2.5-pro=8,gemini-2.0-flash=64"
+ADMISSION_DEFAULT_CONCURRENCY = int(os.getenv("ADMISSION_DEFAULT_CONCURRENCY", 64))
+ADMISSION_MODEL_CONCURRENCY = parse_env_map("ADMISSION_MODEL_CONCURRENCY", int)
+ADMISSION_RETRY_AFTER_SECONDS = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", 1))
+
+## Chat History Configuration
+CHAT_HISTORY_PAGE_SIZE = int(os.getenv("CHAT_HISTORY_PAGE_SIZE", 50))
+CHAT_HISTORY_MAX_PAGE_SIZE = int(os.getenv("CHAT_HISTORY_MAX_PAGE_SIZE", 200))
+
+## Storage Configuration
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "gcs")  # gcs or local
+LOCAL_STORAGE_DIR = os.getenv("LOCAL_STORAGE_DIR", "./storage")
+# Objects above the threshold use resumable uploads sent in chunk-size pieces (multiple of 256 KB)
+STORAGE_RESUMABLE_THRESHOLD = int(os.getenv("STORAGE_RESUMABLE_THRESHOLD", 8 * 1024 * 1024))
+STORAGE_CHUNK_SIZE = int(os.getenv("STORAGE_CHUNK_SIZE", 8 * 1024 * 1024))
+STORAGE_BATCH_CONCURRENCY = int(os.getenv("STORAGE_BATCH_CONCURRENCY", 8))
@@ -1,13 +1,60 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from app.core.config import SQL_DATABASE_URL
+from app.core.config import (SQL_DATABASE_URL,
+                             ASYNC_SQL_DATABASE_URL,
+                             DB_POOL_SIZE,
+                             DB_MAX_OVERFLOW,
+                             DB_POOL_TIMEOUT,
+                             DB_POOL_RECYCLE,
+                             DB_POOL_PRE_PING,
+                             DB_ECHO)
 
 SQLALCHEMY_DATABASE_URL = SQL_DATABASE_URL
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, 
-    connect_args={"check_same_thread": False}, 
-    echo=True
-)
+
+# Async driver used for each backend when ASYNC_DATABASE_URL is not set
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+
+def to_async_url(url: str) -> str:
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if driver is None:
+        return url
+    return parsed.set(drivername=f"{parsed.get_backend_name()}+{driver}").render_as_string(hide_password=False)
+
+
+def _engine_options(url: str) -> dict:
+    options = {"echo": DB_ECHO, "pool_pre_ping": DB_POOL_PRE_PING}
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite":
+        options["connect_args"] = {"check_same_thread": False}
+        if parsed.database in (None, "", ":memory:"):
+            # In-memory databases share a single connection; there is no pool to size
+            return options
+    options.update(
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+    )
+    return options
+
+
+# Sync engine: table creation and code that already runs in worker threads
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **_engine_options(SQLALCHEMY_DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
\ No newline at end of file
+
+# Async engine used by the request handlers and report workers
+ASYNC_DATABASE_URL = ASYNC_SQL_DATABASE_URL or to_async_url(SQLALCHEMY_DATABASE_URL)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **_engine_options(ASYNC_DATABASE_URL))
+# Objects stay readable after commit without another round trip
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+Base = declarative_base()
+
+
+async def close_db():
+    await async_engine.dispose()
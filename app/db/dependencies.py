@@ -1,14 +1,14 @@
-from app.db.database import SessionLocal
-from sqlalchemy.orm import Session
+from app.db.database import AsyncSessionLocal
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import Depends
 from typing import Annotated
 
-def get_db():
-    db = SessionLocal()
+async def get_db():
+    db = AsyncSessionLocal()
     try:
         yield db
     finally:
-        db.close()
+        await db.close()
         
 
-db_dependency = Annotated[Session, Depends(get_db)]
\ No newline at end of file
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
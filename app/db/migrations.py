@@ -0,0 +1,39 @@
+from sqlalchemy import text
+from .database import engine
+from .models import Base
+
+
+# Rows written by SQLite's CURRENT_TIMESTAMP carry no fractional seconds
+# ("YYYY-MM-DD HH:MM:SS"), while SQLAlchemy stores "YYYY-MM-DD HH:MM:SS.ffffff".
+# SQLite compares the two as strings, so mixed rows sort wrongly around keyset
+# cursors; pad the legacy ones to the stored format.
+_LEGACY_TIMESTAMP_COLUMNS = (
+    ("chat_messages", "timestamp"),
+)
+
+
+def _normalize_sqlite_timestamps(conn):
+    for table, column in _LEGACY_TIMESTAMP_COLUMNS:
+        conn.execute(text(
+            f'UPDATE {table} SET "{column}" = "{column}" || \'.000000\' '
+            f'WHERE length("{column}") = 19'
+        ))
+
+
+def _create_missing_indexes(conn):
+    # create_all skips tables that already exist, so indexes added to the
+    # models later (e.g. ix_chat_messages_user_id_timestamp) never reach them
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=conn, checkfirst=True)
+
+
+def run_migrations(bind=engine):
+    """Brings tables created by earlier releases up to the current models.
+
+    Every step is idempotent and runs at startup, after create_all.
+    """
+    with bind.begin() as conn:
+        _create_missing_indexes(conn)
+        if conn.dialect.name == "sqlite":
+            _normalize_sqlite_timestamps(conn)
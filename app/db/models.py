@@ -1,11 +1,17 @@
 import uuid
+from datetime import datetime, timezone
 from sqlalchemy import (
-    Column, String, DateTime, func, Boolean, ForeignKey
+    Column, String, DateTime, func, Boolean, ForeignKey, Index, Integer, Text
 )
 from sqlalchemy.orm import relationship
 from .database import Base
 
 
+def utcnow() -> datetime:
+    # Naive UTC, the same clock func.now() used on SQLite for rows written before
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
 class User(Base):
     __tablename__ = "users"
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
@@ -18,6 +24,7 @@ class User(Base):
     
     chat_messages = relationship("ChatMessages", back_populates="user", cascade="all, delete-orphan")
     file_uploads = relationship("FileUpload", back_populates="user")
+    report_jobs = relationship("ReportJob", back_populates="user", cascade="all, delete-orphan")
 
     
 
@@ -27,10 +34,16 @@ class ChatMessages(Base):
     user_id = Column(String(36), ForeignKey("users.id"))
     message = Column(String, nullable=False)
     response = Column(String, nullable=True)
-    timestamp = Column(DateTime, default=func.now())
+    # Set in Python so timestamps keep sub-second precision and one stored format,
+    # in UTC like the legacy rows; history pages are keyed on (timestamp, id)
+    timestamp = Column(DateTime, default=utcnow)
     
     user = relationship("User", back_populates="chat_messages")
     
+    __table_args__ = (
+        Index("ix_chat_messages_user_id_timestamp", "user_id", "timestamp"),
+    )
+    
     
 class FileUpload(Base):
     __tablename__ = "file_uploads"
@@ -40,4 +53,42 @@ class FileUpload(Base):
     upload_time = Column(DateTime, default=func.now())
     
     user = relationship("User", back_populates="file_uploads")
-    
\ No newline at end of file
+
+
+class ReportJob(Base):
+    __tablename__ = "report_jobs"
+    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = Column(String(36), ForeignKey("users.id"), index=True)
+    status = Column(String, default="queued", index=True)  # queued, running, succeeded, failed
+    stage = Column(String, nullable=True)
+    progress = Column(Integer, default=0)
+    engine = Column(String, default="llm")
+    payload = Column(Text, nullable=False)
+    prediction_cached = Column(Boolean, default=False)
+    error = Column(String, nullable=True)
+    file_upload_id = Column(String(36), ForeignKey("file_uploads.id"), nullable=True)
+    created_at = Column(DateTime, default=datetime.now)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+    
+    user = relationship("User", back_populates="report_jobs")
+    file_upload = relationship("FileUpload")
+
+
+class MailOutbox(Base):
+    __tablename__ = "mail_outbox"
+    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    recipient = Column(String, nullable=False)
+    subject = Column(String, nullable=False)
+    body = Column(Text, nullable=False)
+    status = Column(String, default="queued")  # queued, sending, sent, failed
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.now)
+    claim_id = Column(String(36), nullable=True, index=True)
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.now)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+    sent_at = Column(DateTime, nullable=True)
+    
+    __table_args__ = (
+        Index("ix_mail_outbox_status_next_attempt_at", "status", "next_attempt_at"),
+    )
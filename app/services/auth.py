@@ -1,21 +1,22 @@
 import time
-from sqlalchemy import or_
+from sqlalchemy import or_, select
 from app.schemas.user import CreateUserDTO, UpdateUserDTO, UpdatePassword, ForgotPassword, RecoveryPassword
 from app.db.models import User
-from app.utils.token_config import TokenData
-from app.utils.mail_config import send_mail
+from app.utils.token_config import TokenData, token_digest
+from app.utils.revocation_config import revocation_list
+from app.utils.mail_config import enqueue_mail
+from app.utils.user_cache import Principal, user_cache
+from app.utils.password_config import password_hasher
 from fastapi import Depends, HTTPException, Query, Request, status
 from fastapi.responses import JSONResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
 from app.db.dependencies import db_dependency
-from passlib.context import CryptContext
 from app.core.config import (SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES)
 from datetime import datetime, timedelta
 from typing import Annotated
 
 
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
 
 SECRET_KEY = SECRET_KEY
@@ -27,6 +28,11 @@ async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]):
     try:
         payload = TokenData.decode_token(token)
         
+        if revocation_list.is_revoked(token_digest(token)):
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
+                                detail='Token has been revoked',
+                                headers={"WWW-Authenticate": "Bearer"})
+        
         username: str = payload.get('sub') 
         
         if username is None:
@@ -49,8 +55,32 @@ async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]):
 user_dependency = Annotated[dict, Depends(get_current_user)]
 
 
+async def get_current_principal(user: user_dependency, db: db_dependency) -> Principal:
+    """Resolves the token's user once per request, from the cache when possible."""
+    user_id = user.get("id")
+    principal = user_cache.get(user_id)
+    
+    if principal is None:
+        generation = user_cache.generation(user_id)
+        user_model = await db.get(User, user_id)
+        
+        if not user_model:
+            raise HTTPException(status_code=404, detail="User not found")
+        
+        principal = Principal.from_user(user_model)
+        user_cache.set(principal, generation)
+    
+    if not principal.is_active:
+        raise HTTPException(status_code=403, detail="User is inactive")
+    
+    return principal
+
+
+principal_dependency = Annotated[Principal, Depends(get_current_principal)]
+
+
 async def create_user(create_user_dto: CreateUserDTO, db: db_dependency):
-    hashed_password = pwd_context.hash(create_user_dto.password)
+    hashed_password = await password_hasher.hash(create_user_dto.password)
     db_user = User(
         email=create_user_dto.email,
         user_name=create_user_dto.username,
@@ -58,15 +88,15 @@ async def create_user(create_user_dto: CreateUserDTO, db: db_dependency):
         role=create_user_dto.role or 'user',
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 
 async def login(form_data: Annotated[OAuth2PasswordRequestForm, Depends()], 
                 db: db_dependency):
     
-    user = authenticate_user(form_data.username, form_data.password, db)
+    user = await authenticate_user(form_data.username, form_data.password, db)
     
     if not user:
         raise HTTPException(status_code=400, detail="Incorrect username or password")
@@ -88,7 +118,16 @@ async def login(form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
     return response
 
 
-def authenticate_user(username: str, 
+# revokes the presented token for every worker until it would have expired
+async def logout(token: Annotated[str, Depends(oauth2_scheme)]):
+    payload = TokenData.decode_token(token)
+    
+    await revocation_list.revoke(token_digest(token), payload.get("exp"))
+    
+    return TokenData.remove_token_from_cookies()
+
+
+async def authenticate_user(username: str, 
                       password: str, 
                       db: db_dependency):
     # check if username is username or email
@@ -96,22 +135,28 @@ def authenticate_user(username: str,
         return "@" in username and "." in username
     
     if check_if_email(username):
-        user = db.query(User).filter(User.email==username).first()
+        user = (await db.scalars(select(User).filter(User.email==username))).first()
     else: 
-        user = db.query(User).filter(User.user_name==username).first()
+        user = (await db.scalars(select(User).filter(User.user_name==username))).first()
         
     if not user:
         raise HTTPException(status_code=404, detail="Incorrect username or password")
-    if not pwd_context.verify(password, user.hashed_password):
+    verified, new_hash = await password_hasher.verify_and_update(password, user.hashed_password)
+    if not verified:
         raise HTTPException(status_code=400, detail="Incorrect username or password")
     
+    if new_hash:
+        # Stored hash predates the current Argon2 parameters
+        user.hashed_password = new_hash
+        await db.commit()
+    
     return user
 
 
 async def send_veification_mail(user: user_dependency, 
                                 db: db_dependency,
                                 ):
-    user_model = db.query(User).filter(User.id == user.get("id")).first()
+    user_model = await db.get(User, user.get("id"))
     
     if not user_model:
         raise HTTPException(status_code=404, detail="User not found")
@@ -126,7 +171,8 @@ async def send_veification_mail(user: user_dependency,
     )
 
     
-    await send_mail(
+    await enqueue_mail(
+        db,
         email=user_model.email,
         subject="Verify your account",
         body=f"Use this token to verify your account: http://127.0.0.1:8000/api/auth/verify?token={token}"
@@ -143,15 +189,15 @@ async def verify_user(db: db_dependency,
     
     payload = TokenData.decode_token(token)
     
-    user_model = db.query(User).filter(User.id == payload.get("id")).first()
+    user_model = await db.get(User, payload.get("id"))
     
     if not user_model:
         raise HTTPException(status_code=404, detail="User not found")
     
     user_model.is_verified = 1
     
-    db.commit()
-    db.refresh(user_model)
+    await db.commit()
+    await db.refresh(user_model)
 
     
     return {
@@ -162,7 +208,7 @@ async def verify_user(db: db_dependency,
     
 async def send_forgot_password_mail(db: db_dependency,
                                     email: ForgotPassword):
-    user_model = db.query(User).filter(User.email==email.email).first()
+    user_model = (await db.scalars(select(User).filter(User.email==email.email))).first()
     
     if not user_model:
         raise HTTPException(status_code=404, detail="Email address not found")
@@ -174,7 +220,8 @@ async def send_forgot_password_mail(db: db_dependency,
     )
 
     
-    await send_mail(
+    await enqueue_mail(
+        db,
         email=user_model.email,
         subject="Forgot Password",
         body=f"Use this token to verify your account: http://127.0.0.1:8000/api/auth/forgot-password?token={token}"
@@ -191,14 +238,14 @@ async def verify_password(db: db_dependency,
                           ):
     payload = TokenData.decode_token(token=token)
     
-    user_model = db.query(User).filter(User.id == payload.get("id")).first()
+    user_model = await db.get(User, payload.get("id"))
     
     if not user_model:
         raise HTTPException(status_code=401, detail="User not found")
     
-    user_model.hashed_password = pwd_context.hash(password.password)
+    user_model.hashed_password = await password_hasher.hash(password.password)
     
-    db.commit()
+    await db.commit()
     return {
         "message": f"{user_model.email}, you have successfully changed your password."
     }
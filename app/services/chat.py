@@ -1,45 +1,93 @@
-from fastapi import Depends, HTTPException, File, UploadFile
+import base64
+import json
+import math
+from contextlib import aclosing
+from datetime import datetime
+from fastapi import HTTPException, File, UploadFile, Query, Request, Path
+from fastapi.responses import StreamingResponse
+from sqlalchemy import or_, select, tuple_
+from sqlalchemy.orm import selectinload
 from app.schemas.chat import (ChatMessageDTO, 
                           BussinessDataDTO)
-from app.db.models import User, ChatMessages, FileUpload
+from app.db.models import ChatMessages, ReportJob
 from app.db.dependencies import db_dependency
-from .auth import user_dependency
-from ai.main_agent import (generate_reply as ask_llm,
-                              predict_demand_v2,
-                              generate_report_html, 
-                              process_audio, 
+from .auth import principal_dependency
+from ai.main_agent import (generate_reply_async as ask_llm,
+                              process_audio_async, 
+                              stream_reply_async,
+                              CHAT_MODEL,
+                              TRANSCRIBE_MODEL,
                             )
-from app.utils.cloud_storage_config import upload_blob, download_blob
-from app.core.config import CLOUD_BUCKET_NAME
-from datetime import datetime
-from app.utils.pdf_config import convert_html_to_pdf
+from .reports import report_workers
+from ai.audio import AudioStats, AudioTooLargeError, AUDIO_MAX_UPLOAD_BYTES
+from app.utils.metrics_config import record_audio
+from app.utils.admission_config import rate_limits, rate_limiter, model_slots
+from app.core.config import (CHAT_HISTORY_PAGE_SIZE,
+                             CHAT_HISTORY_MAX_PAGE_SIZE,
+                             ADMISSION_RETRY_AFTER_SECONDS)
+from typing import Literal, Optional
+
+
+
+def admit(endpoint: str, model: Optional[str] = None):
+    """Dependency answering 429 with Retry-After instead of letting work queue up.
 
+    Requests are refused when the user's token bucket for `endpoint` is
+    empty or when `model` already has its cap of requests in flight. The
+    model slot is held until the response is sent, streamed replies included.
+    """
+    limit = rate_limits[endpoint]
+    
+    async def admission(user: principal_dependency):
+        if model is not None and not model_slots.try_acquire(model):
+            raise HTTPException(status_code=429,
+                                detail="Too many requests in progress, try again shortly",
+                                headers={"Retry-After": str(ADMISSION_RETRY_AFTER_SECONDS)})
+        try:
+            retry_after = await rate_limiter.acquire(f"{endpoint}:{user.id}", limit)
+            if retry_after > 0:
+                raise HTTPException(status_code=429,
+                                    detail="Rate limit exceeded",
+                                    headers={"Retry-After": str(math.ceil(retry_after))})
+            yield
+        finally:
+            if model is not None:
+                model_slots.release(model)
+    
+    return admission
 
 
+chat_admission = admit("chat", CHAT_MODEL)
+audio_admission = admit("audio", TRANSCRIBE_MODEL)
+analytics_admission = admit("analytics")
 
 
 async def chat_with_ai(
     chat_message: ChatMessageDTO,
-    user: user_dependency,
-    db: db_dependency
+    user: principal_dependency,
+    db: db_dependency,
+    request: Request,
+    stream: bool = Query(False, description="Stream the reply as Server-Sent Events")
 ):
-    user_model = db.query(User).filter(User.id == user.get("id")).first()
-    
-    if not user_model:
-        raise HTTPException(status_code=404, detail="User not found")
+    if stream:
+        return StreamingResponse(
+            _stream_chat(user.id, chat_message.message, request, db),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
     
     # Here you would integrate with your AI model to get a response
     
-    ai_response = ask_llm(user_model.id, chat_message.message)
+    ai_response = await ask_llm(user.id, chat_message.message)
     
     # Save chat history
     chat_history_model = ChatMessages(
-        user_id=user_model.id,
+        user_id=user.id,
         message=chat_message.message,
         response=ai_response
     )
     db.add(chat_history_model)
-    db.commit()
+    await db.commit()
     
     return {
         "user_message": chat_message.message,
@@ -47,96 +95,172 @@ async def chat_with_ai(
     }
     
     
+async def _stream_chat(user_id: str, message: str, request: Request, db):
+    chunks = []
+    async with aclosing(stream_reply_async(user_id, message)) as tokens:
+        async for token in tokens:
+            if await request.is_disconnected():
+                # Client went away: stop generating and keep nothing
+                return
+            chunks.append(token)
+            yield f"data: {json.dumps({'token': token})}\n\n"
+    
+    ai_response = "".join(chunks).strip()
+    
+    # Save chat history once the full reply is assembled
+    chat_history_model = ChatMessages(
+        user_id=user_id,
+        message=message,
+        response=ai_response
+    )
+    db.add(chat_history_model)
+    await db.commit()
+    
+    yield f"event: done\ndata: {json.dumps({'user_message': message, 'ai_response': ai_response})}\n\n"
+    
+    
+def _encode_cursor(chat: ChatMessages) -> str:
+    # Some legacy rows have no timestamp; those sort after every dated row
+    timestamp = chat.timestamp.isoformat() if chat.timestamp is not None else None
+    raw = json.dumps([timestamp, chat.id])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(cursor: str):
+    try:
+        timestamp, chat_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return (datetime.fromisoformat(timestamp) if timestamp is not None else None), chat_id
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+# newest first; pass next_cursor back to get the following page
 async def get_chat_history(
-    user: user_dependency,
-    db: db_dependency
+    user: principal_dependency,
+    db: db_dependency,
+    limit: int = Query(CHAT_HISTORY_PAGE_SIZE, ge=1, le=CHAT_HISTORY_MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page")
 ):
-    user_model = db.query(User).filter(User.id == user.get("id")).first()
+    query = select(ChatMessages).filter(ChatMessages.user_id == user.id)
     
-    if not user_model:
-        raise HTTPException(status_code=404, detail="User not found")
+    if cursor:
+        # Keyset: continue strictly after the last row of the previous page
+        timestamp, chat_id = _decode_cursor(cursor)
+        if timestamp is None:
+            query = query.filter(ChatMessages.timestamp.is_(None), ChatMessages.id < chat_id)
+        else:
+            # A row-value comparison lets the (user_id, timestamp) index seek straight to it
+            query = query.filter(or_(
+                tuple_(ChatMessages.timestamp, ChatMessages.id) < (timestamp, chat_id),
+                ChatMessages.timestamp.is_(None),
+            ))
     
-    chat_histories = db.query(ChatMessages).filter(ChatMessages.user_id == user_model.id).all()
+    # One extra row tells us whether another page exists
+    chat_histories = (await db.scalars(
+        query.order_by(ChatMessages.timestamp.desc().nulls_last(), ChatMessages.id.desc()).limit(limit + 1)
+    )).all()
     
-    return [
-        {
-            "id": chat.id,
-            "message": chat.message,
-            "response": chat.response,
-            "timestamp": chat.timestamp
-        }
-        for chat in chat_histories
-    ]
+    has_more = len(chat_histories) > limit
+    chat_histories = chat_histories[:limit]
+    
+    return {
+        "messages": [
+            {
+                "id": chat.id,
+                "message": chat.message,
+                "response": chat.response,
+                "timestamp": chat.timestamp
+            }
+            for chat in chat_histories
+        ],
+        "next_cursor": _encode_cursor(chat_histories[-1]) if has_more else None
+    }
     
     
 
     
     
 async def transcribe_audio_file(
-    user: user_dependency,
+    user: principal_dependency,
     db: db_dependency,
     file: UploadFile = File(...)
 ):
-    user_model = db.query(User).filter(User.id == user.get("id")).first()
-    
-    if not user_model:
-        raise HTTPException(status_code=404, detail="User not found")
-    
+    if file.size is not None and file.size > AUDIO_MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413,
+                            detail=f"Audio uploads are limited to {AUDIO_MAX_UPLOAD_BYTES // (1024 * 1024)} MB")
+
     # Transcribe audio file
-    response, transcription = process_audio(user_model.id, file.file)
+    audio_stats = AudioStats()
+    try:
+        response, transcription = await process_audio_async(user.id, file.file, audio_stats)
+    except AudioTooLargeError:
+        # Only WAV can be split; other formats must fit in a single request
+        raise HTTPException(status_code=413,
+                            detail="Audio file too large; upload WAV or a shorter recording")
+    record_audio(audio_stats)
     
     
     # Save transcription record
     chat_history_model = ChatMessages(
-        user_id=user_model.id,
+        user_id=user.id,
         message=transcription,
         response=response
     )
     db.add(chat_history_model)
-    db.commit()
+    await db.commit()
     
     return {
-        "transcription": response
+        "transcription": response,
+        "audio_bytes_saved": audio_stats.bytes_saved
     }
     
 
-# generate analytics pdf report from predictions and save to cloud storage
+# queue an analytics pdf report; a report worker predicts, renders and uploads it
 async def generate_analytics_report(
     business_data: BussinessDataDTO,
-    user: user_dependency,
-    db: db_dependency
+    user: principal_dependency,
+    db: db_dependency,
+    engine: Literal["local", "llm", "hybrid"] = Query("llm", description="Demand engine: local scoring, LLM, or local with LLM for ambiguous products")
 ):
-    user_model = db.query(User).filter(User.id == user.get("id")).first()
+    report_job_model = ReportJob(
+        user_id=user.id,
+        engine=engine,
+        payload=json.dumps(business_data.model_dump())
+    )
+    db.add(report_job_model)
+    await db.commit()
     
-    if not user_model:
-        raise HTTPException(status_code=404, detail="User not found")
+    report_workers.notify()
     
-    # Generate demand predictions and save to output file
-    output_file = f"{user_model.id}{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-    prediction = predict_demand_v2(business_data.dict())
+    return {
+        "job_id": report_job_model.id,
+        "status": report_job_model.status
+    }
     
-    # Generate HTML report
-    html_content = generate_report_html(prediction)
-    # Convert HTML to PDF
-    output_file = await convert_html_to_pdf(html_content, output_file)
     
+async def get_report_job(
+    user: principal_dependency,
+    db: db_dependency,
+    job_id: str = Path(...)
+):
+    job_model = (await db.scalars(
+        select(ReportJob)
+        .options(selectinload(ReportJob.file_upload))
+        .filter(ReportJob.id == job_id, ReportJob.user_id == user.id)
+    )).first()
     
-    # Upload report to cloud storage
-    bucket_name = CLOUD_BUCKET_NAME
-    blob_name = f"reports_{output_file}"
-    upload_blob(bucket_name, output_file, blob_name)
+    if not job_model:
+        raise HTTPException(status_code=404, detail="Report job not found")
     
-    # Save file upload record
-    file_upload_model = FileUpload(
-        user_id=user_model.id,
-        #file_name=output_file,
-        file_path=f"https://storage.googleapis.com/{bucket_name}/{blob_name}",
-        upload_time=datetime.now()
-    )
-    db.add(file_upload_model)
-    db.commit()
+    file_model = job_model.file_upload
     
     return {
-        "file_name": output_file,
-        "file_url": f"https://storage.googleapis.com/{bucket_name}/{blob_name}"
-    }
\ No newline at end of file
+        "job_id": job_model.id,
+        "status": job_model.status,
+        "stage": job_model.stage,
+        "progress": job_model.progress,
+        "error": job_model.error,
+        "prediction_cached": job_model.prediction_cached,
+        "file_id": file_model.id if file_model else None,
+        "file_url": file_model.file_path if file_model else None
+    }
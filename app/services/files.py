@@ -1,26 +1,20 @@
 from fastapi import HTTPException, Depends, Path, UploadFile
+from sqlalchemy import select
 from app.db.models import User, ChatMessages, FileUpload
 from app.db.dependencies import db_dependency
-from .auth import user_dependency
-from ai.main_agent import (generate_reply as ask_llm,
-                              predict_demand_v2,
-                              generate_report_html, 
-                              transcribe_audio)
+from .auth import principal_dependency
 from app.utils.cloud_storage_config import upload_blob, download_blob
 from app.core.config import CLOUD_BUCKET_NAME
 from datetime import datetime
 
 
 async def get_all_files(
-    user: user_dependency,
+    user: principal_dependency,
     db: db_dependency
 ):
-    user_model = db.query(User).filter(User.id == user.get("id")).first()
-    
-    if not user_model:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    files = db.query(FileUpload).filter(FileUpload.user_id == user_model.id).all()
+    files = (await db.scalars(
+        select(FileUpload).filter(FileUpload.user_id == user.id)
+    )).all()
     
     return [
         {
@@ -33,17 +27,14 @@ async def get_all_files(
     
     
 async def get_file_by_id(
-    user: user_dependency,
+    user: principal_dependency,
     db: db_dependency,
     file_id: str = Path(...)
 ):
-    user_model = db.query(User).filter(User.id == user.get("id")).first()
-    
-    if not user_model:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    file_model = db.query(FileUpload).filter(FileUpload.id == file_id,
-                                             FileUpload.user_id == user_model.id).first()
+    file_model = (await db.scalars(
+        select(FileUpload).filter(FileUpload.id == file_id,
+                                  FileUpload.user_id == user.id)
+    )).first()
     
     if not file_model:
         raise HTTPException(status_code=404, detail="File not found")
@@ -56,17 +47,11 @@ async def get_file_by_id(
     
     
 async def get_user_profile(
-    user: user_dependency,
-    db: db_dependency
+    user: principal_dependency
 ):
-    user_model = db.query(User).filter(User.id == user.get("id")).first()
-    
-    if not user_model:
-        raise HTTPException(status_code=404, detail="User not found")
-    
     return {
-        "id": user_model.id,
-        "username": user_model.user_name,
-        "email": user_model.email,
-        "role": user_model.role,
+        "id": user.id,
+        "username": user.user_name,
+        "email": user.email,
+        "role": user.role,
     }
\ No newline at end of file
@@ -0,0 +1,129 @@
+import asyncio
+import json
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import select, update
+from app.db.models import ReportJob, FileUpload
+from ai.main_agent import (predict_demand_cached,
+                              generate_report_narrative_async,
+                            )
+from ai.dispatch import BATCH, llm_priority
+from app.utils.cloud_storage_config import upload_bytes, storage_service
+from app.utils.pdf_config import convert_html_to_pdf
+from app.utils.report_config import render_report_html
+from app.utils.worker_pool import WorkerPool, keep_alive, requeue_stale
+from app.core.config import (CLOUD_BUCKET_NAME,
+                             REPORT_WORKERS,
+                             REPORT_POLL_SECONDS,
+                             REPORT_JOB_STALE_SECONDS)
+
+
+async def _update_job(db, job: ReportJob, **fields):
+    for key, value in fields.items():
+        setattr(job, key, value)
+    await db.commit()
+
+
+async def _claim_next_job(db) -> Optional[ReportJob]:
+    """Moves the oldest queued job to running.
+
+    The conditional UPDATE makes the claim safe when several processes run
+    workers against the same database.
+    """
+    job = (await db.scalars(
+        select(ReportJob)
+        .filter(ReportJob.status == "queued")
+        .order_by(ReportJob.created_at)
+        .limit(1)
+    )).first()
+    if not job:
+        return None
+
+    claimed = await db.execute(
+        update(ReportJob)
+        .filter(ReportJob.id == job.id, ReportJob.status == "queued")
+        .values(status="running", stage="starting")
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    if not claimed.rowcount:
+        return None
+
+    await db.refresh(job)
+    return job
+
+
+async def run_report_job(db, job: ReportJob):
+    """Prediction -> HTML -> PDF -> upload, recording progress as it goes."""
+    business_data = json.loads(job.payload)
+
+    await _update_job(db, job, stage="predicting", progress=10)
+    prediction, prediction_cached = await predict_demand_cached(business_data, job.engine)
+
+    await _update_job(db, job, stage="rendering", progress=40, prediction_cached=prediction_cached)
+    prediction = json.loads(prediction)
+    narrative = await generate_report_narrative_async(prediction)
+    html_content = render_report_html(business_data, prediction, narrative)
+
+    await _update_job(db, job, stage="converting", progress=60)
+    pdf = await convert_html_to_pdf(html_content)
+
+    await _update_job(db, job, stage="uploading", progress=80)
+    # The job id keeps names unique when workers finish within the same second
+    output_file = f"{job.user_id}{datetime.now().strftime('%Y%m%d_%H%M%S')}_{job.id[:8]}.pdf"
+    bucket_name = CLOUD_BUCKET_NAME
+    blob_name = f"reports_{output_file}"
+    await asyncio.to_thread(upload_bytes, bucket_name, pdf, blob_name, "application/pdf")
+
+    # Save file upload record
+    file_upload_model = FileUpload(
+        user_id=job.user_id,
+        file_path=storage_service.public_url(bucket_name, blob_name),
+        upload_time=datetime.now()
+    )
+    db.add(file_upload_model)
+    await db.flush()
+
+    await _update_job(db, job, status="succeeded", stage="done", progress=100,
+                file_upload_id=file_upload_model.id)
+
+
+class ReportWorkerPool(WorkerPool):
+    """Runs queued report jobs on `concurrency` asyncio workers.
+
+    Every process started with the app runs its own pool, so throughput
+    scales with the number of uvicorn workers as well.
+    """
+
+    name = "Report worker"
+
+    def __init__(self, concurrency: int = REPORT_WORKERS, poll_interval: float = REPORT_POLL_SECONDS,
+                 stale_seconds: float = REPORT_JOB_STALE_SECONDS):
+        super().__init__(concurrency, poll_interval, sweep_interval=stale_seconds / 2)
+        self.stale_seconds = stale_seconds
+
+    async def recover(self, db):
+        await requeue_stale(db, ReportJob, "running", self.stale_seconds, stage=None, progress=0)
+
+    async def run_once(self, db, index: int) -> bool:
+        job = await _claim_next_job(db)
+        if job is None:
+            return False
+
+        # A rollback expires the job, so keep its id for the log line
+        job_id = job.id
+        try:
+            # Report model calls yield to interactive chat
+            # A single stage can outlast the stale window; keep the job marked live
+            async with keep_alive(ReportJob, self.stale_seconds / 3,
+                                  ReportJob.id == job_id, ReportJob.status == "running"):
+                with llm_priority(BATCH, job.user_id):
+                    await run_report_job(db, job)
+        except Exception as e:
+            await db.rollback()
+            print(f"Report job {job_id} failed: {e}")
+            await _update_job(db, job, status="failed", error=str(e))
+        return True
+
+
+report_workers = ReportWorkerPool()
@@ -5,15 +5,17 @@ from fastapi import (Depends,
 from schemas.user import UpdateUserDTO, UpdatePassword, CreateUserDTO
 from db.models import User
 from db.dependencies import db_dependency
-from .auth import user_dependency, pwd_context
+from .auth import user_dependency
+from app.utils.password_config import password_hasher
 from app.utils.cloud_storage_config import uploader, cloudinary
 from time import time
+from sqlalchemy import select
 
 
 async def get_user_details(user: user_dependency,
                            db: db_dependency
                             ):
-    user_model = db.query(User).filter(User.id == user.get("id")).first()
+    user_model = await db.get(User, user.get("id"))
     
     if not user_model:
         raise HTTPException(status_code=404, detail="User not found")
@@ -30,7 +32,7 @@ async def update_user_details(user_update: UpdateUserDTO,
                               user: user_dependency,
                               db: db_dependency
 ):
-    user_model = db.query(User).filter(User.id == user.get("id")).first()
+    user_model = await db.get(User, user.get("id"))
     
     if not user_model:
         raise HTTPException(status_code=404, detail="Target user not found")
@@ -39,11 +41,11 @@ async def update_user_details(user_update: UpdateUserDTO,
     
     user_model.email = data_update.get("email", user_model.email)
     user_model.username = data_update.get("username", user_model.username)
-    user_model.hashed_password = pwd_context.hash(data_update.get("password", user_model.hashed_password))
+    user_model.hashed_password = await password_hasher.hash(data_update.get("password", user_model.hashed_password))
     user_model.role = data_update.get("role", user_model.role)
     user_model.is_active = data_update.get("is_active", user_model.is_active)
     
-    db.commit()
+    await db.commit()
     
     return {
         "username" : user_model.username,
@@ -58,16 +60,17 @@ async def update_user_password(password_update: UpdatePassword,
                                username: str,
                                db: db_dependency
                                 ):
-    user_model = db.query(User).filter(User.username == username).first()
+    user_model = (await db.scalars(select(User).filter(User.username == username))).first()
     if not user_model:
         raise HTTPException(status_code=404, detail="User not found")
     
-    if not pwd_context.verify(password_update.old_password, user_model.hashed_password):
+    verified, _ = await password_hasher.verify_and_update(password_update.old_password, user_model.hashed_password)
+    if not verified:
         raise HTTPException(status_code=400, detail="Old password is incorrect")
     
-    user_model.hashed_password = pwd_context.hash(password_update.new_password)
+    user_model.hashed_password = await password_hasher.hash(password_update.new_password)
     
-    db.commit()
+    await db.commit()
     
     return {
         "message": "Password updated successfully"
@@ -78,7 +81,7 @@ async def upload_profile_img(user: user_dependency,
                              db: db_dependency,
                              file: UploadFile = File(...),
                                 ):
-    user_model = db.query(User).filter(User.id == user.get("id")).first()
+    user_model = await db.get(User, user.get("id"))
     
     if not user_model:
         raise HTTPException(status_code=404, detail="User not found")
@@ -91,7 +94,7 @@ async def upload_profile_img(user: user_dependency,
                                         )
         
         user_model.profile_image = upload_result.get("secure_url")
-        db.commit()
+        await db.commit()
         print(upload_result)
         return {
             "detail": "Profile image uploaded successfully"
@@ -104,7 +107,7 @@ async def upload_profile_img(user: user_dependency,
 async def get_profile_img(user: user_dependency,
                           db: db_dependency
                            ):
-    user_model = db.query(User).filter(User.id == user.get("id")).first()
+    user_model = await db.get(User, user.get("id"))
     
     if not user_model:
         raise HTTPException(status_code=404, detail="User not found")
@@ -0,0 +1,148 @@
+import time
+from collections import OrderedDict
+from typing import Dict, Tuple
+from redis.exceptions import RedisError
+from app.utils.redis_config import get_redis
+from app.core.config import (ADMISSION_BACKEND,
+                             ADMISSION_MAX_BUCKETS,
+                             ADMISSION_DEFAULT_CONCURRENCY,
+                             ADMISSION_MODEL_CONCURRENCY,
+                             CHAT_RATE_PER_MINUTE,
+                             CHAT_RATE_BURST,
+                             AUDIO_RATE_PER_MINUTE,
+                             AUDIO_RATE_BURST,
+                             ANALYTICS_RATE_PER_MINUTE,
+                             ANALYTICS_RATE_BURST)
+
+
+class RateLimit:
+    """Token bucket refilled at `per_minute` tokens a minute, holding up to `burst`."""
+
+    __slots__ = ("rate", "burst")
+
+    def __init__(self, per_minute: float, burst: int):
+        self.rate = per_minute / 60
+        self.burst = burst
+
+
+rate_limits = {
+    "chat": RateLimit(CHAT_RATE_PER_MINUTE, CHAT_RATE_BURST),
+    "audio": RateLimit(AUDIO_RATE_PER_MINUTE, AUDIO_RATE_BURST),
+    "analytics": RateLimit(ANALYTICS_RATE_PER_MINUTE, ANALYTICS_RATE_BURST),
+}
+
+
+class MemoryRateLimiter:
+    """Token buckets held in process; least recently used buckets are dropped first."""
+
+    def __init__(self, max_buckets: int = ADMISSION_MAX_BUCKETS):
+        self.max_buckets = max_buckets
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def acquire(self, key: str, limit: RateLimit) -> float:
+        """Takes a token from `key`'s bucket.
+
+        Returns 0 when the request is admitted, otherwise the seconds until
+        a token will be available.
+        """
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (limit.burst, now))
+        tokens = min(limit.burst, tokens + (now - updated) * limit.rate)
+
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / limit.rate
+
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_buckets:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+# Refill and take in one step on the server, so every worker shares the bucket
+_TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return tostring(wait)
+"""
+
+
+class RedisRateLimiter:
+    """Token buckets shared through Redis by every worker.
+
+    Each bucket is a hash updated by a server-side script and expires once
+    it would be full again. Redis errors admit the request, so an
+    unavailable Redis never blocks chat.
+    """
+
+    def __init__(self, namespace: str = "ratelimit"):
+        self.prefix = f"arziki:{namespace}:"
+        self._script = None
+
+    async def acquire(self, key: str, limit: RateLimit) -> float:
+        if self._script is None:
+            self._script = get_redis().register_script(_TOKEN_BUCKET_SCRIPT)
+        try:
+            wait = await self._script(keys=[self.prefix + key], args=[limit.rate, limit.burst])
+        except RedisError as e:
+            print(f"Rate limit check failed: {e}")
+            return 0.0
+        return float(wait)
+
+
+def create_rate_limiter(backend: str = ADMISSION_BACKEND):
+    if backend == "redis":
+        return RedisRateLimiter()
+    if backend == "memory":
+        return MemoryRateLimiter()
+    raise ValueError(f"Unknown admission backend: {backend}")
+
+
+rate_limiter = create_rate_limiter()
+
+
+class ModelSlots:
+    """Caps the admitted requests in flight per model in this process.
+
+    Unlike the semaphores around the GenAI calls, a full model rejects
+    straight away instead of queuing the request.
+    """
+
+    def __init__(self, default_limit: int = ADMISSION_DEFAULT_CONCURRENCY,
+                 limits: Dict[str, int] = ADMISSION_MODEL_CONCURRENCY):
+        self.default_limit = default_limit
+        self.limits = limits
+        self.in_flight: Dict[str, int] = {}
+
+    def try_acquire(self, model: str) -> bool:
+        in_flight = self.in_flight.get(model, 0)
+        if in_flight >= self.limits.get(model, self.default_limit):
+            return False
+        self.in_flight[model] = in_flight + 1
+        return True
+
+    def release(self, model: str):
+        self.in_flight[model] -= 1
+
+
+model_slots = ModelSlots()
@@ -1,10 +1,21 @@
 # cloud_storage_config.py
 from google.cloud import storage
+from typing import BinaryIO, Iterable, List, Optional, Tuple
+import asyncio
+import io
 import os
+import shutil
+import threading
+from app.utils.metrics_config import storage_seconds, storage_errors, storage_in_flight, track
+from app.core.config import (STORAGE_BACKEND,
+                             LOCAL_STORAGE_DIR,
+                             STORAGE_RESUMABLE_THRESHOLD,
+                             STORAGE_CHUNK_SIZE,
+                             STORAGE_BATCH_CONCURRENCY)
 
 # --- Configuration ---
 # Replace with your actual bucket name
-BUCKET_NAME = "your-unique-bucket-name" 
+BUCKET_NAME = "your-unique-bucket-name"
 # Replace with the local path to the file you want to upload (e.g., 'my_report.pdf')
 LOCAL_FILE_TO_UPLOAD = "test_image.jpg"
 # The name you want the file to have in the bucket (e.g., 'user_uploads/img101.jpg')
@@ -14,45 +25,145 @@ LOCAL_FILE_FOR_DOWNLOAD = "downloaded_file.jpg"
 # ---------------------
 
 
-def upload_blob(bucket_name, source_file_name, destination_blob_name):
-    """Uploads a file to the GCS bucket."""
-    
-    # 1. Instantiate a client (authenticates automatically)
-    storage_client = storage.Client()
-    
-    # 2. Get the target bucket object
-    bucket = storage_client.bucket(bucket_name)
-    
-    # 3. Create a blob (object) name in the bucket
-    blob = bucket.blob(destination_blob_name)
+class GCSStorage:
+    """Google Cloud Storage backend sharing one long-lived client.
+
+    The client authenticates once and keeps its HTTP session, so repeated
+    uploads reuse connections. Objects larger than STORAGE_RESUMABLE_THRESHOLD
+    (or of unknown size) go through resumable uploads in STORAGE_CHUNK_SIZE
+    pieces; smaller ones are sent in a single request.
+    """
+
+    def __init__(self):
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self) -> storage.Client:
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = storage.Client()
+        return self._client
+
+    def _blob(self, bucket_name, blob_name, size: Optional[int] = None):
+        chunked = size is None or size > STORAGE_RESUMABLE_THRESHOLD
+        return self.client.bucket(bucket_name).blob(
+            blob_name, chunk_size=STORAGE_CHUNK_SIZE if chunked else None
+        )
+
+    def upload_stream(self, bucket_name, stream: BinaryIO, blob_name, content_type=None, size: Optional[int] = None):
+        blob = self._blob(bucket_name, blob_name, size)
+        blob.upload_from_file(stream, size=size, content_type=content_type)
+
+    def download_stream(self, bucket_name, blob_name, stream: BinaryIO):
+        self._blob(bucket_name, blob_name).download_to_file(stream)
+
+    def delete(self, bucket_name, blob_name):
+        self._blob(bucket_name, blob_name).delete()
+
+    def public_url(self, bucket_name, blob_name) -> str:
+        return f"https://storage.googleapis.com/{bucket_name}/{blob_name}"
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+
+class LocalStorage:
+    """Filesystem backend with the same interface, for offline runs and benchmarks."""
+
+    def __init__(self, root: str = LOCAL_STORAGE_DIR):
+        self.root = root
+
+    def _path(self, bucket_name, blob_name) -> str:
+        path = os.path.abspath(os.path.join(self.root, bucket_name or "default", blob_name))
+        if not path.startswith(os.path.abspath(self.root) + os.sep):
+            raise ValueError(f"Invalid blob name: {blob_name}")
+        return path
+
+    def upload_stream(self, bucket_name, stream: BinaryIO, blob_name, content_type=None, size: Optional[int] = None):
+        path = self._path(bucket_name, blob_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            shutil.copyfileobj(stream, f, STORAGE_CHUNK_SIZE)
+
+    def download_stream(self, bucket_name, blob_name, stream: BinaryIO):
+        with open(self._path(bucket_name, blob_name), "rb") as f:
+            shutil.copyfileobj(f, stream, STORAGE_CHUNK_SIZE)
+
+    def delete(self, bucket_name, blob_name):
+        os.remove(self._path(bucket_name, blob_name))
+
+    def public_url(self, bucket_name, blob_name) -> str:
+        return "file://" + self._path(bucket_name, blob_name)
+
+    def close(self):
+        pass
+
+
+def create_storage(backend: str = STORAGE_BACKEND):
+    if backend == "gcs":
+        return GCSStorage()
+    if backend == "local":
+        return LocalStorage()
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+storage_service = create_storage()
+
 
+def _track(operation: str):
+    return track(storage_seconds, storage_errors, storage_in_flight,
+                 backend=STORAGE_BACKEND, operation=operation)
+
+
+def upload_bytes(bucket_name, data: bytes, destination_blob_name, content_type="application/octet-stream"):
+    """Uploads in-memory bytes to the bucket without a temporary file."""
+    with _track("upload"):
+        storage_service.upload_stream(bucket_name, io.BytesIO(data), destination_blob_name,
+                                      content_type=content_type, size=len(data))
+    print(f"✅ {len(data)} bytes uploaded successfully as {destination_blob_name}.")
+
+
+def upload_fileobj(bucket_name, stream: BinaryIO, destination_blob_name, content_type=None,
+                   size: Optional[int] = None):
+    """Uploads an open file from its current position, without reading it into memory."""
+    with _track("upload"):
+        storage_service.upload_stream(bucket_name, stream, destination_blob_name,
+                                      content_type=content_type, size=size)
+
+
+def delete_blob(bucket_name, blob_name):
+    with _track("delete"):
+        storage_service.delete(bucket_name, blob_name)
+
+
+def download_bytes(bucket_name, source_blob_name) -> bytes:
+    buffer = io.BytesIO()
+    with _track("download"):
+        storage_service.download_stream(bucket_name, source_blob_name, buffer)
+    return buffer.getvalue()
+
+
+def upload_blob(bucket_name, source_file_name, destination_blob_name):
+    """Uploads a file to the bucket, streaming it from disk."""
     print(f"Uploading {source_file_name} to {bucket_name}/{destination_blob_name}...")
-    
-    # 4. Upload the file from the local path
-    blob.upload_from_filename(source_file_name)
 
-    # Note: If your bucket is public, the public URL will be:
-    # f"https://storage.googleapis.com/{bucket_name}/{destination_blob_name}"
-    
+    with open(source_file_name, "rb") as f, _track("upload"):
+        storage_service.upload_stream(bucket_name, f, destination_blob_name,
+                                      size=os.path.getsize(source_file_name))
+
     print(
         f"✅ File {source_file_name} uploaded successfully as {destination_blob_name}."
     )
-    
+
 
 def download_blob(bucket_name, source_blob_name, destination_file_name):
-    """Downloads a blob from the GCS bucket to a local file."""
-    
-    # 1. Instantiate a client (authenticates automatically)
-    storage_client = storage.Client()
-
-    # 2. Get the target bucket object
-    bucket = storage_client.bucket(bucket_name)
-    
-    # 3. Construct a client-side representation of a blob
-    blob = bucket.blob(source_blob_name)
-    
-    # 4. Download the blob to the specified local file path
-    blob.download_to_filename(destination_file_name)
+    """Downloads a blob from the bucket to a local file."""
+    with open(destination_file_name, "wb") as f, _track("download"):
+        storage_service.download_stream(bucket_name, source_blob_name, f)
 
     print(
         f"⬇️ Blob {source_blob_name} downloaded from bucket {bucket_name} "
@@ -60,20 +171,43 @@ def download_blob(bucket_name, source_blob_name, destination_file_name):
     )
 
 
+async def upload_many(bucket_name, items: Iterable[Tuple[str, bytes, str]],
+                      concurrency: int = STORAGE_BATCH_CONCURRENCY):
+    """Uploads (blob_name, data, content_type) items concurrently."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def upload(blob_name, data, content_type):
+        async with semaphore:
+            await asyncio.to_thread(upload_bytes, bucket_name, data, blob_name, content_type)
+
+    await asyncio.gather(*(upload(*item) for item in items))
+
+
+async def download_many(bucket_name, blob_names: Iterable[str],
+                        concurrency: int = STORAGE_BATCH_CONCURRENCY) -> List[bytes]:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def download(blob_name):
+        async with semaphore:
+            return await asyncio.to_thread(download_bytes, bucket_name, blob_name)
+
+    return await asyncio.gather(*(download(name) for name in blob_names))
+
+
 if __name__ == "__main__":
     # --- Example Usage ---
-    
+
     # Ensure a dummy file exists for the upload test
     if not os.path.exists(LOCAL_FILE_TO_UPLOAD):
         with open(LOCAL_FILE_TO_UPLOAD, 'w') as f:
             f.write("This is a test file for GCS upload.")
-            
+
     # 1. UPLOAD
     try:
         upload_blob(BUCKET_NAME, LOCAL_FILE_TO_UPLOAD, DESTINATION_BLOB_NAME)
     except Exception as e:
         print(f"Upload failed. Check your BUCKET_NAME and credentials. Error: {e}")
-        
+
     print("-" * 30)
 
     # 2. DOWNLOAD
@@ -82,4 +216,4 @@ if __name__ == "__main__":
     try:
         download_blob(BUCKET_NAME, DESTINATION_BLOB_NAME, LOCAL_FILE_FOR_DOWNLOAD)
     except Exception as e:
-        print(f"Download failed. Check the blob/file name and permissions. Error: {e}")
\ No newline at end of file
+        print(f"Download failed. Check the blob/file name and permissions. Error: {e}")
@@ -0,0 +1,85 @@
+from collections import OrderedDict
+from typing import Callable, Generic, Hashable, Optional, Tuple, TypeVar
+import threading
+import time
+
+V = TypeVar("V")
+
+
+class LRUCache(Generic[V]):
+    """Thread-safe LRU map whose entries expire at a deadline.
+
+    The least recently used entries are dropped once there are more than
+    `max_entries` of them or, when `max_size` is set, once the sizes given
+    to `set` add up to more than that. Deadlines default to `ttl` seconds
+    from now on `clock`; callers with their own expiry (e.g. a token's
+    `exp` against time.time) pass it to `set`. `on_evict` is called for
+    every entry dropped for age or room, not for `pop` or replacement.
+
+    `lock` is reentrant, so owners can hold it to make several calls atomic.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl: Optional[float] = None,
+        max_size: Optional[int] = None,
+        clock: Callable[[], float] = time.monotonic,
+        on_evict: Optional[Callable[[], None]] = None,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_size = max_size
+        self.clock = clock
+        self.on_evict = on_evict
+        self.size = 0
+        self.lock = threading.RLock()
+        self._entries: "OrderedDict[Hashable, Tuple[V, float, int]]" = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[V]:
+        """Returns the live value and marks it recently used."""
+        with self.lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= self.clock():
+                self._evict(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def entry(self, key: Hashable) -> Optional[Tuple[V, float]]:
+        """(value, deadline) as stored, expired or not, without touching recency."""
+        with self.lock:
+            entry = self._entries.get(key)
+            return None if entry is None else (entry[0], entry[1])
+
+    def set(self, key: Hashable, value: V, size: int = 0, expires: Optional[float] = None):
+        if expires is None:
+            expires = self.clock() + self.ttl
+        with self.lock:
+            self.pop(key)
+            self._entries[key] = (value, expires, size)
+            self.size += size
+
+            while self._entries and (
+                len(self._entries) > self.max_entries
+                or (self.max_size is not None and self.size > self.max_size)
+            ):
+                self._evict(next(iter(self._entries)))
+
+    def pop(self, key: Hashable) -> Optional[V]:
+        with self.lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return None
+            self.size -= entry[2]
+            return entry[0]
+
+    def _evict(self, key: Hashable):
+        self.pop(key)
+        if self.on_evict is not None:
+            self.on_evict()
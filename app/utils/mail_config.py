@@ -1,6 +1,24 @@
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
-from app.core.config import (ZOHO_EMAIL, ZOHO_SMTP_PASSWORD, ZOHO_SMTP_PORT, ZOHO_SMTP_HOST)
- 
+import time
+import uuid
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from typing import List, Optional
+import aiosmtplib
+from fastapi_mail import ConnectionConfig
+from sqlalchemy import select, update
+from app.db.models import MailOutbox
+from app.utils.worker_pool import WorkerPool, requeue_stale
+from app.core.config import (ZOHO_EMAIL, ZOHO_SMTP_PASSWORD, ZOHO_SMTP_PORT, ZOHO_SMTP_HOST,
+                             MAIL_SMTP_CONNECTIONS,
+                             MAIL_BATCH_SIZE,
+                             MAIL_POLL_SECONDS,
+                             MAIL_MAX_ATTEMPTS,
+                             MAIL_RETRY_BASE_SECONDS,
+                             MAIL_RETRY_MAX_SECONDS,
+                             MAIL_SENDING_STALE_SECONDS,
+                             MAIL_SMTP_TIMEOUT,
+                             MAIL_SMTP_IDLE_SECONDS)
+
 
 conf = ConnectionConfig(
     MAIL_USERNAME=ZOHO_EMAIL,
@@ -14,19 +32,216 @@ conf = ConnectionConfig(
     VALIDATE_CERTS=True
 )
 
-# use in a route
-from fastapi import FastAPI #, BackgroundTasks
-app = FastAPI()
 
+class MailSessionError(Exception):
+    """The SMTP server could not be reached or refused our login."""
+
+
+def _retry_delay(attempts: int) -> float:
+    return min(MAIL_RETRY_MAX_SECONDS, MAIL_RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+
+
+def _is_permanent(error: Exception) -> bool:
+    # 5xx replies mean the message will never be accepted; anything else may pass later
+    if isinstance(error, aiosmtplib.SMTPRecipientsRefused):
+        return all(refused.code >= 500 for refused in error.recipients)
+    return isinstance(error, aiosmtplib.SMTPResponseException) and error.code >= 500
+
+
+def _build_message(mail: MailOutbox) -> EmailMessage:
+    message = EmailMessage()
+    message["From"] = conf.MAIL_FROM
+    message["To"] = mail.recipient
+    message["Subject"] = mail.subject
+    message.set_content(mail.body)
+    return message
+
+
+async def _claim_batch(db, limit: int):
+    """Moves up to `limit` due messages to sending and returns them.
+
+    Rows are tagged with a claim id, so senders never pick up the same
+    message, whether they run in this process or another one.
+    """
+    while True:
+        now = datetime.now()
+        ids = (await db.scalars(
+            select(MailOutbox.id)
+            .filter(MailOutbox.status == "queued", MailOutbox.next_attempt_at <= now)
+            .order_by(MailOutbox.next_attempt_at)
+            .limit(limit)
+        )).all()
+        if not ids:
+            return []
 
-async def send_mail( email: str, subject: str, body: str): #background_tasks: BackgroundTasks,
-    message = MessageSchema(
-        subject=subject,
-        recipients=[email],
-        body=body,
-        subtype=MessageType.plain
+        claim_id = str(uuid.uuid4())
+        await db.execute(
+            update(MailOutbox)
+            .filter(MailOutbox.id.in_(ids), MailOutbox.status == "queued",
+                    MailOutbox.next_attempt_at <= now)
+            .values(status="sending", claim_id=claim_id, updated_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+
+        mails = (await db.scalars(
+            select(MailOutbox).filter(MailOutbox.claim_id == claim_id)
+        )).all()
+        # An empty claim means another sender took these rows first; look again
+        if mails:
+            return mails
+
+
+async def _touch_claim(db, claim_id: str):
+    await db.execute(
+        update(MailOutbox)
+        .filter(MailOutbox.claim_id == claim_id, MailOutbox.status == "sending")
+        .values(updated_at=datetime.now())
+        .execution_options(synchronize_session=False)
     )
 
-    fm = FastMail(conf)
-    await fm.send_message(message)
-    
\ No newline at end of file
+
+def _schedule_retry(mail: MailOutbox, error: Exception):
+    mail.attempts += 1
+    mail.claim_id = None
+    mail.error = str(error)
+    if _is_permanent(error) or mail.attempts >= MAIL_MAX_ATTEMPTS:
+        mail.status = "failed"
+    else:
+        mail.status = "queued"
+        mail.next_attempt_at = datetime.now() + timedelta(seconds=_retry_delay(mail.attempts))
+
+
+class SmtpSession:
+    """One authenticated SMTP connection, opened on first use and then kept."""
+
+    def __init__(self):
+        self._smtp: Optional[aiosmtplib.SMTP] = None
+        self.last_used = 0.0
+
+    @property
+    def is_open(self) -> bool:
+        return self._smtp is not None and self._smtp.is_connected
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        if self.is_open:
+            return self._smtp
+
+        smtp = aiosmtplib.SMTP(
+            hostname=conf.MAIL_SERVER,
+            port=conf.MAIL_PORT,
+            username=conf.MAIL_USERNAME if conf.USE_CREDENTIALS else None,
+            password=conf.MAIL_PASSWORD.get_secret_value() if conf.USE_CREDENTIALS else None,
+            use_tls=conf.MAIL_SSL_TLS,
+            start_tls=conf.MAIL_STARTTLS,
+            validate_certs=conf.VALIDATE_CERTS,
+            timeout=MAIL_SMTP_TIMEOUT,
+        )
+        try:
+            await smtp.connect()
+        except Exception as e:
+            raise MailSessionError(str(e)) from e
+        self._smtp = smtp
+        return smtp
+
+    async def send(self, message: EmailMessage):
+        try:
+            await (await self._connect()).send_message(message)
+        except aiosmtplib.SMTPServerDisconnected:
+            # The server closed a session we thought was open; reconnect once
+            self._smtp = None
+            await (await self._connect()).send_message(message)
+        self.last_used = time.monotonic()
+
+    async def close(self):
+        smtp, self._smtp = self._smtp, None
+        if smtp is None or not smtp.is_connected:
+            return
+        try:
+            await smtp.quit()
+        except aiosmtplib.SMTPException:
+            smtp.close()
+
+
+class MailSender(WorkerPool):
+    """Sends the mail outbox in the background over persistent SMTP sessions.
+
+    Each of the `connections` workers keeps its own authenticated session
+    and reuses it for every message in its batches, until the session has
+    been idle for `idle_seconds` or the server drops it. Failed messages go
+    back to the outbox with exponential backoff and are given up after
+    MAIL_MAX_ATTEMPTS tries or a permanent 5xx reply.
+    """
+
+    name = "Mail sender"
+
+    def __init__(self, connections: int = MAIL_SMTP_CONNECTIONS,
+                 batch_size: int = MAIL_BATCH_SIZE,
+                 poll_interval: float = MAIL_POLL_SECONDS,
+                 idle_seconds: float = MAIL_SMTP_IDLE_SECONDS,
+                 stale_seconds: float = MAIL_SENDING_STALE_SECONDS):
+        super().__init__(connections, poll_interval, sweep_interval=stale_seconds / 2)
+        self.stale_seconds = stale_seconds
+        self.batch_size = batch_size
+        self.idle_seconds = idle_seconds
+        self._sessions: List[SmtpSession] = []
+
+    async def start(self):
+        self._sessions = [SmtpSession() for _ in range(self.concurrency)]
+        await super().start()
+
+    async def stop(self):
+        await super().stop()
+        for session in self._sessions:
+            await session.close()
+        self._sessions = []
+
+    async def recover(self, db):
+        await requeue_stale(db, MailOutbox, "sending", self.stale_seconds, claim_id=None)
+
+    async def run_once(self, db, index: int) -> bool:
+        # A full batch means more is probably waiting
+        return await self._send_batch(db, self._sessions[index]) >= self.batch_size
+
+    async def before_wait(self, index: int):
+        session = self._sessions[index]
+        if session.is_open and time.monotonic() - session.last_used >= self.idle_seconds:
+            await session.close()
+
+    async def _send_batch(self, db, session: SmtpSession) -> int:
+        mails = await _claim_batch(db, self.batch_size)
+        claim_id = mails[0].claim_id if mails else None
+        for index, mail in enumerate(mails):
+            try:
+                await session.send(_build_message(mail))
+            except MailSessionError as e:
+                # Nothing else will get through either; back off the whole batch
+                print(f"Mail server unavailable: {e}")
+                for pending in mails[index:]:
+                    _schedule_retry(pending, e)
+                await db.commit()
+                break
+            except Exception as e:
+                print(f"Mail {mail.id} to {mail.recipient} failed: {e}")
+                _schedule_retry(mail, e)
+            else:
+                mail.status = "sent"
+                mail.claim_id = None
+                mail.sent_at = datetime.now()
+            # The rest of the batch is still ours; keep it from looking abandoned
+            await _touch_claim(db, claim_id)
+            # Committed per message so a crash never resends what already went out
+            await db.commit()
+        return len(mails)
+
+
+mail_sender = MailSender()
+
+
+async def enqueue_mail(db, email: str, subject: str, body: str) -> MailOutbox:
+    """Stores a plain-text message in the outbox; the background sender delivers it."""
+    mail = MailOutbox(recipient=email, subject=subject, body=body)
+    db.add(mail)
+    await db.commit()
+    mail_sender.notify()
+    return mail
@@ -0,0 +1,174 @@
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from sqlalchemy import event
+from app.db.database import engine, async_engine
+
+# Model calls take seconds to minutes; DB queries, milliseconds
+LLM_BUCKETS = (0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80, 160, 320)
+IO_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+
+llm_seconds = Histogram("arziki_llm_request_seconds", "Gemini call latency",
+                        ["model", "operation"], buckets=LLM_BUCKETS)
+llm_errors = Counter("arziki_llm_errors", "Failed Gemini calls", ["model", "operation"])
+llm_in_flight = Gauge("arziki_llm_in_flight", "Gemini calls in progress", ["model", "operation"])
+llm_tokens = Counter("arziki_llm_tokens", "Tokens reported in usage_metadata", ["model", "kind"])
+
+pdf_seconds = Histogram("arziki_pdf_render_seconds", "HTML to PDF conversion latency",
+                        ["backend"], buckets=IO_BUCKETS)
+pdf_errors = Counter("arziki_pdf_render_errors", "Failed PDF conversions", ["backend"])
+pdf_in_flight = Gauge("arziki_pdf_render_in_flight", "PDF conversions in progress", ["backend"])
+
+storage_seconds = Histogram("arziki_storage_seconds", "Object storage operation latency",
+                            ["backend", "operation"], buckets=IO_BUCKETS)
+storage_errors = Counter("arziki_storage_errors", "Failed object storage operations", ["backend", "operation"])
+storage_in_flight = Gauge("arziki_storage_in_flight", "Object storage operations in progress",
+                          ["backend", "operation"])
+
+db_query_seconds = Histogram("arziki_db_query_seconds", "Database statement latency",
+                             ["statement"], buckets=DB_BUCKETS)
+db_query_errors = Counter("arziki_db_query_errors", "Failed database statements", ["statement"])
+
+audio_bytes = Counter("arziki_audio_normalize_bytes",
+                      "Audio bytes read from uploads (input), sent to the model (output) and saved by normalization",
+                      ["kind"])
+
+cache_hits = Counter("arziki_cache_hits", "Lookups answered from the cache", ["cache"])
+cache_misses = Counter("arziki_cache_misses", "Lookups that had to compute or load the value", ["cache"])
+cache_evictions = Counter("arziki_cache_evictions", "Entries dropped for size or age", ["cache"])
+cache_bytes_saved = Counter("arziki_cache_bytes_saved", "Input bytes not sent to the model thanks to a hit", ["cache"])
+cache_entries = Gauge("arziki_cache_entries", "Entries held in the cache", ["cache"])
+cache_bytes = Gauge("arziki_cache_bytes", "Approximate bytes held in the cache", ["cache"])
+
+
+@contextmanager
+def track(histogram: Histogram, errors: Counter, in_flight: Gauge, **labels):
+    """Times the block into `histogram`, counting it in flight and on failure."""
+    gauge = in_flight.labels(**labels)
+    gauge.inc()
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        errors.labels(**labels).inc()
+        raise
+    finally:
+        histogram.labels(**labels).observe(time.perf_counter() - start)
+        gauge.dec()
+
+
+# usage_metadata field for each token kind we count
+_USAGE_FIELDS = (
+    ("prompt", "prompt_token_count"),
+    ("output", "candidates_token_count"),
+    ("thoughts", "thoughts_token_count"),
+    ("cached", "cached_content_token_count"),
+)
+
+
+def record_usage(model: str, usage_metadata):
+    if usage_metadata is None:
+        return
+    for kind, field in _USAGE_FIELDS:
+        count = getattr(usage_metadata, field, None)
+        if count:
+            llm_tokens.labels(model=model, kind=kind).inc(count)
+
+
+def record_audio(stats):
+    """Counts one upload's AudioStats."""
+    audio_bytes.labels(kind="input").inc(stats.input_bytes)
+    audio_bytes.labels(kind="output").inc(stats.output_bytes)
+    audio_bytes.labels(kind="saved").inc(stats.bytes_saved)
+
+
+# --- Database statements, timed on every engine ---
+
+def _statement(statement: str) -> str:
+    verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    return verb if verb in ("SELECT", "INSERT", "UPDATE", "DELETE") else "OTHER"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info["query_start"].pop()
+    db_query_seconds.labels(statement=_statement(statement)).observe(time.perf_counter() - start)
+
+
+def _handle_error(context):
+    starts = context.connection.info.get("query_start") if context.connection is not None else None
+    if starts:
+        starts.pop()
+    db_query_errors.labels(statement=_statement(context.statement or "")).inc()
+
+
+for _engine in (engine, async_engine.sync_engine):
+    event.listen(_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(_engine, "handle_error", _handle_error)
+
+
+class LLMQueueCollector:
+    """Reads the LLM dispatcher's queue depth and waits at scrape time."""
+
+    def __init__(self, stats: Callable[[], Dict[str, dict]]):
+        self.stats = stats
+
+    def collect(self):
+        limit = GaugeMetricFamily("arziki_llm_slots", "Concurrent call slots per model", labels=["model"])
+        in_flight = GaugeMetricFamily("arziki_llm_slots_in_use", "Call slots in use per model", labels=["model"])
+        queued = GaugeMetricFamily("arziki_llm_queue_depth", "Calls waiting for a slot",
+                                   labels=["model", "priority"])
+        dispatched = CounterMetricFamily("arziki_llm_queue_dispatched", "Calls granted a slot",
+                                         labels=["model", "priority"])
+        waited = CounterMetricFamily("arziki_llm_queue_wait_seconds", "Total time calls waited for a slot",
+                                     labels=["model", "priority"])
+        longest = GaugeMetricFamily("arziki_llm_queue_wait_max_seconds", "Longest wait for a slot",
+                                    labels=["model", "priority"])
+
+        for model, stats in self.stats().items():
+            limit.add_metric([model], stats["limit"])
+            in_flight.add_metric([model], stats["in_flight"])
+            for priority, queue in stats["classes"].items():
+                queued.add_metric([model, priority], queue["queued"])
+                dispatched.add_metric([model, priority], queue["dispatched"])
+                waited.add_metric([model, priority], queue["wait_seconds_total"])
+                longest.add_metric([model, priority], queue["wait_seconds_max"])
+
+        return [limit, in_flight, queued, dispatched, waited, longest]
+
+
+def register_llm_queue(stats: Callable[[], Dict[str, dict]]):
+    REGISTRY.register(LLMQueueCollector(stats))
+
+
+def _totals(counter: Counter) -> Dict[str, float]:
+    return {
+        sample.labels["cache"]: sample.value
+        for metric in counter.collect()
+        for sample in metric.samples
+        if sample.name.endswith("_total")
+    }
+
+
+class CacheHitRatioCollector:
+    """Derives each cache's hit ratio from the hit and miss counters at scrape time."""
+
+    def collect(self):
+        ratio = GaugeMetricFamily("arziki_cache_hit_ratio", "Share of lookups answered from the cache",
+                                  labels=["cache"])
+        hits, misses = _totals(cache_hits), _totals(cache_misses)
+        # A cache that only ever misses still reports a ratio, of 0
+        for cache in sorted(hits.keys() | misses.keys()):
+            lookups = hits.get(cache, 0) + misses.get(cache, 0)
+            ratio.add_metric([cache], hits.get(cache, 0) / lookups if lookups else 0.0)
+        return [ratio]
+
+
+REGISTRY.register(CacheHitRatioCollector())
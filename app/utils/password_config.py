@@ -0,0 +1,74 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+from passlib.context import CryptContext
+from app.core.config import (ARGON2_TIME_COST,
+                             ARGON2_MEMORY_COST,
+                             ARGON2_PARALLELISM,
+                             PASSWORD_HASH_WORKERS)
+
+pwd_context = CryptContext(
+    schemes=["argon2"],
+    deprecated="auto",
+    argon2__time_cost=ARGON2_TIME_COST,
+    argon2__memory_cost=ARGON2_MEMORY_COST,
+    argon2__parallelism=ARGON2_PARALLELISM,
+)
+
+
+# Run inside the pool workers
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify_and_update(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return pwd_context.verify_and_update(password, hashed_password)
+
+
+class PasswordHasher:
+    """Runs Argon2 in a bounded pool of worker processes.
+
+    Each hash takes tens of milliseconds of CPU. Doing it off the event loop
+    keeps other requests moving while logins are hashed, and `workers`
+    processes hash in parallel on multi-core hosts. Workers are spawned
+    rather than forked, since the API process runs threads.
+    """
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS):
+        self.workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    async def start(self):
+        # Spawn the workers up front so the first logins don't pay for it
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(
+            loop.run_in_executor(self.executor, _hash, "") for _ in range(self.workers)
+        ))
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    async def hash(self, password: str) -> str:
+        return await asyncio.get_running_loop().run_in_executor(self.executor, _hash, password)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Returns (verified, new_hash); new_hash is set when the stored hash
+        was made with different cost parameters and should be replaced."""
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, _verify_and_update, password, hashed_password
+        )
+
+
+password_hasher = PasswordHasher()
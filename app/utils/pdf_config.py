@@ -1,27 +1,162 @@
 import convertapi
 import asyncio
-from app.core.config import CONVERT_API_SECRET
+import io
+from typing import Optional
+from playwright.async_api import async_playwright
+from app.utils.metrics_config import pdf_seconds, pdf_errors, pdf_in_flight, track
+from app.core.config import (CONVERT_API_SECRET,
+                             PDF_BACKEND,
+                             PDF_POOL_SIZE,
+                             PDF_CONTEXT_MAX_RENDERS,
+                             PDF_ACQUIRE_TIMEOUT_SECONDS)
+
+# Same layout ConvertAPI produces: 10mm margins, portrait
+PDF_MARGIN = {"top": "10mm", "bottom": "10mm", "left": "10mm", "right": "10mm"}
+
 
 def remove_before_doctype(html_str):
     doctype_index = html_str.find("<!DOCTYPE html>")
     return html_str if doctype_index == -1 else html_str[doctype_index:]
 
 
-def create_html_file(html_content):
+class ChromiumPdfPool:
+    """Pool of warm headless-Chromium contexts used to print HTML to PDF.
+
+    One browser is launched on first use and `size` context slots are kept.
+    A context is replaced after `max_renders` renders, or straight away if
+    a render fails, so leaked state never builds up. A retired context's
+    slot goes back to the pool empty and straight away, even if the render
+    is cancelled, and the next render to take it opens a new context,
+    relaunching the browser if that fails. The pool never loses capacity.
+    """
+
+    def __init__(self, size: int = PDF_POOL_SIZE, max_renders: int = PDF_CONTEXT_MAX_RENDERS,
+                 acquire_timeout: float = PDF_ACQUIRE_TIMEOUT_SECONDS):
+        self.size = size
+        self.max_renders = max_renders
+        self.acquire_timeout = acquire_timeout
+        self._playwright = None
+        self._browser = None
+        self._contexts: Optional[asyncio.Queue] = None
+        self._start_lock = asyncio.Lock()
+
+    async def start(self):
+        async with self._start_lock:
+            if self._contexts is not None:
+                return
+            self._playwright = await async_playwright().start()
+            contexts = asyncio.Queue()
+            try:
+                self._browser = await self._playwright.chromium.launch()
+                for _ in range(self.size):
+                    contexts.put_nowait((await self._browser.new_context(), 0))
+            except BaseException:
+                # Don't leave a half-started browser running behind a pool that isn't there
+                while not contexts.empty():
+                    await _close_quietly(contexts.get_nowait()[0])
+                await _close_quietly(self._browser)
+                await self._playwright.stop()
+                self._browser = self._playwright = None
+                raise
+            self._contexts = contexts
+
+    async def close(self):
+        if self._contexts is None:
+            return
+        while not self._contexts.empty():
+            context, _ = self._contexts.get_nowait()
+            await _close_quietly(context)
+        await _close_quietly(self._browser)
+        await self._playwright.stop()
+        self._contexts = self._browser = self._playwright = None
+
+    async def _relaunch(self, failed_browser):
+        async with self._start_lock:
+            # Another render may already have replaced the browser
+            if self._browser is not failed_browser:
+                return
+            print("Relaunching Chromium for the PDF pool")
+            await _close_quietly(failed_browser)
+            self._browser = await self._playwright.chromium.launch()
+
+    async def _new_context(self):
+        browser = self._browser
+        try:
+            return await browser.new_context()
+        except Exception as e:
+            print(f"Could not open a Chromium context ({e})")
+            await self._relaunch(browser)
+            return await self._browser.new_context()
+
+    async def render(self, html_content: str) -> bytes:
+        await self.start()
+        try:
+            context, renders = await asyncio.wait_for(self._contexts.get(), timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            raise RuntimeError(f"No PDF renderer free after {self.acquire_timeout:g}s")
+
+        healthy = False
+        try:
+            if context is None:
+                context, renders = await self._new_context(), 0
+            page = await context.new_page()
+            try:
+                await page.set_content(html_content, wait_until="load")
+                pdf = await page.pdf(
+                    format="A4",
+                    landscape=False,
+                    margin=PDF_MARGIN,
+                    print_background=True,
+                )
+            finally:
+                await page.close()
+            healthy = True
+            return pdf
+        finally:
+            renders += 1
+            keep = context is not None and healthy and renders < self.max_renders
+            # The slot goes back before anything is awaited, so a cancelled render
+            # can't lose it; a retired context is replaced by the next render
+            self._contexts.put_nowait((context, renders) if keep else (None, 0))
+            if context is not None and not keep:
+                await asyncio.shield(_close_quietly(context))
+
+
+async def _close_quietly(target):
+    if target is None:
+        return
+    try:
+        await target.close()
+    except Exception:
+        pass
+
+
+pdf_pool = ChromiumPdfPool()
+
+
+async def start_pdf_pool():
+    """Pre-launches the browser at startup so the first report is not slowed down."""
+    if PDF_BACKEND != "chromium":
+        return
+    try:
+        await pdf_pool.start()
+    except Exception as e:
+        # Rendering retries the launch; a missing browser shouldn't stop the API
+        print(f"Could not start Chromium PDF pool: {e}")
+
+
+async def convert_html_to_pdf(html_content: str, backend: str = PDF_BACKEND) -> bytes:
+    """Converts an HTML document to PDF bytes; nothing touches the disk."""
     html_content = remove_before_doctype(html_content)
-    with open("my_page.html", "w") as f:
-        f.write(html_content)
 
+    with track(pdf_seconds, pdf_errors, pdf_in_flight, backend=backend):
+        if backend == "chromium":
+            return await pdf_pool.render(html_content)
 
-async def convert_html_to_pdf(html_content: str, output_file: str):
-    create_html_file(html_content)
+        return await asyncio.to_thread(html_to_pdf_sync, html_content)
 
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(
-        None, html_to_pdf_sync, output_file, "my_page.html"
-    )
 
-def html_to_pdf_sync(output_pdf, input_html="my_page.html"):
+def html_to_pdf_sync(html_content: str) -> bytes:
     
 
     # Use your REAL ConvertAPI Secret Key (NOT Secret ID)
@@ -30,7 +165,7 @@ def html_to_pdf_sync(output_pdf, input_html="my_page.html"):
     result = convertapi.convert(
         'pdf',
         {
-            'File': input_html,
+            'File': convertapi.UploadIO(io.BytesIO(html_content.encode("utf-8")), "report.html"),
             'MarginTop': '10',
             'MarginBottom': '10',
             'MarginLeft': '10',
@@ -40,7 +175,4 @@ def html_to_pdf_sync(output_pdf, input_html="my_page.html"):
         from_format='html'
     )
 
-    result.file.save(output_pdf)
-    print(f"PDF saved as {output_pdf}")
-    return output_pdf
-
+    return result.file.io.getvalue()
@@ -0,0 +1,19 @@
+import redis.asyncio as redis
+from app.core.config import REDIS_URL
+
+_client = None
+
+
+def get_redis() -> redis.Redis:
+    """Returns the process-wide async Redis client, created on first use."""
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(REDIS_URL)
+    return _client
+
+
+async def close_redis():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,40 @@
+import os
+from jinja2 import Environment, FileSystemLoader, Undefined, select_autoescape
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "templates")
+
+
+def _money(value):
+    # LLM predictions don't always carry every field
+    if value is None or isinstance(value, Undefined):
+        return ""
+    try:
+        return f"{float(value):,.2f}"
+    except (TypeError, ValueError):
+        return value
+
+
+env = Environment(
+    loader=FileSystemLoader(TEMPLATES_DIR),
+    autoescape=select_autoescape(["html"]),
+    trim_blocks=True,
+    lstrip_blocks=True,
+)
+env.filters["money"] = _money
+
+# Compiled once at import and reused for every report
+report_template = env.get_template("report.html")
+
+
+def render_report_html(business_data: dict, prediction: dict, narrative: dict) -> str:
+    """Renders the analytics report; only the narrative text comes from the LLM."""
+    metadata = business_data.get("metadata") or {}
+    profile = [(str(key).replace("_", " ").title(), value) for key, value in metadata.items()]
+
+    return report_template.render(
+        business_name=prediction.get("business_name") or business_data.get("business_name"),
+        profile=profile,
+        predictions=prediction.get("predictions", []),
+        executive_summary=narrative.get("executive_summary", []),
+        recommendations=narrative.get("recommendations", []),
+    )
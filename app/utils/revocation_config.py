@@ -0,0 +1,129 @@
+import asyncio
+import time
+from typing import Dict, Optional
+from redis.exceptions import RedisError
+from app.utils.redis_config import get_redis
+from app.core.config import TOKEN_REVOCATION_BACKEND, TOKEN_REVOCATION_RETRY_SECONDS
+
+
+class MemoryRevocationList:
+    """Revoked token digests held in process, each kept until its token expires."""
+
+    def __init__(self):
+        self._entries: Dict[str, float] = {}
+        self._next_purge = 1024
+
+    def is_revoked(self, digest: str) -> bool:
+        expires_at = self._entries.get(digest)
+        if expires_at is None:
+            return False
+        if expires_at <= time.time():
+            self._entries.pop(digest, None)
+            return False
+        return True
+
+    def add(self, digest: str, expires_at: float):
+        self._entries[digest] = expires_at
+        if len(self._entries) >= self._next_purge:
+            now = time.time()
+            self._entries = {d: exp for d, exp in self._entries.items() if exp > now}
+            self._next_purge = max(1024, 2 * len(self._entries))
+
+    async def revoke(self, digest: str, expires_at: float):
+        self.add(digest, expires_at)
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+
+class RedisRevocationList:
+    """Revocation list shared through Redis and mirrored in every process.
+
+    Each revoked digest is stored as its own key expiring with the token and
+    announced on a pub/sub channel. Every process loads the keys at startup
+    and applies announcements as they arrive, so checks are a local O(1)
+    lookup with no round trip. Revocations made in this process apply even
+    if Redis is unreachable.
+    """
+
+    def __init__(self, namespace: str = "revoked", retry_seconds: float = TOKEN_REVOCATION_RETRY_SECONDS):
+        self.prefix = f"arziki:{namespace}:"
+        self.channel = f"arziki:{namespace}"
+        self.retry_seconds = retry_seconds
+        self._local = MemoryRevocationList()
+        self._task: Optional[asyncio.Task] = None
+
+    def is_revoked(self, digest: str) -> bool:
+        return self._local.is_revoked(digest)
+
+    async def revoke(self, digest: str, expires_at: float):
+        self._local.add(digest, expires_at)
+        ttl = max(1, int(expires_at - time.time()) + 1)
+        try:
+            redis = get_redis()
+            await redis.set(self.prefix + digest, expires_at, ex=ttl)
+            await redis.publish(self.channel, f"{digest} {expires_at}")
+        except RedisError as e:
+            print(f"Token revocation not shared through Redis: {e}")
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _load(self):
+        redis = get_redis()
+        keys = [key async for key in redis.scan_iter(match=self.prefix + "*", count=1000)]
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            for key, expires_at in zip(batch, await redis.mget(batch)):
+                if expires_at is None:
+                    continue
+                try:
+                    self._local.add(key.decode("utf-8")[len(self.prefix):], float(expires_at))
+                except ValueError:
+                    print(f"Skipping malformed revocation {key!r}: {expires_at!r}")
+
+    async def _listen(self):
+        while True:
+            pubsub = get_redis().pubsub()
+            try:
+                # Subscribe before loading so nothing revoked in between is missed
+                await pubsub.subscribe(self.channel)
+                await self._load()
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    try:
+                        digest, expires_at = message["data"].decode("utf-8").split()
+                        self._local.add(digest, float(expires_at))
+                    except (ValueError, AttributeError) as e:
+                        # One bad publisher must not stop the mirror for every other revocation
+                        print(f"Skipping malformed revocation message {message['data']!r}: {e}")
+            except (RedisError, OSError) as e:
+                print(f"Token revocation listener error: {e}")
+                await asyncio.sleep(self.retry_seconds)
+            except Exception as e:
+                print(f"Token revocation listener failed unexpectedly: {e!r}")
+                await asyncio.sleep(self.retry_seconds)
+            finally:
+                await pubsub.aclose()
+
+
+def create_revocation_list(backend: str = TOKEN_REVOCATION_BACKEND):
+    if backend == "redis":
+        return RedisRevocationList()
+    if backend == "memory":
+        return MemoryRevocationList()
+    raise ValueError(f"Unknown token revocation backend: {backend}")
+
+
+revocation_list = create_revocation_list()
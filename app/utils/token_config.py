@@ -1,10 +1,45 @@
+from typing import Optional
+import hashlib
+import time
+import uuid
 from jose import ExpiredSignatureError, jwt, JWTError
 from datetime import datetime, timedelta
-from app.core.config import SECRET_KEY, ALGORITHM
+from app.core.config import SECRET_KEY, ALGORITHM, TOKEN_CACHE_MAX_ENTRIES
+from app.utils.lru_cache import LRUCache
 from fastapi import HTTPException
 from fastapi.responses import JSONResponse
 
 
+def token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class TokenCache:
+    """LRU cache of verified claims keyed by token digest.
+
+    An entry is only served until the token's own `exp`, after which the
+    token goes back through full verification and is rejected as expired.
+    """
+
+    def __init__(self, max_entries: int = TOKEN_CACHE_MAX_ENTRIES):
+        self._entries: LRUCache[dict] = LRUCache(max_entries, clock=time.time)
+
+    def get(self, digest: str) -> Optional[dict]:
+        return self._entries.get(digest)
+
+    def set(self, digest: str, claims: dict):
+        expires_at = claims.get("exp")
+        if expires_at is None:
+            return
+        self._entries.set(digest, claims, expires=float(expires_at))
+
+    def invalidate(self, digest: str):
+        self._entries.pop(digest)
+
+
+token_cache = TokenCache()
+
+
 class TokenData:
     def __init__(self, username: str):
         self.username = username
@@ -16,7 +51,9 @@ class TokenData:
             "sub": self.username,
             "id": user_id,
             "role": role,
-            "exp": expire_time
+            "exp": expire_time,
+            # Unique per token, so revoking one login never revokes another
+            "jti": uuid.uuid4().hex
         }
         
         return jwt.encode(encode, SECRET_KEY, algorithm=ALGORITHM)
@@ -25,6 +62,12 @@ class TokenData:
     #decode token
     @staticmethod
     def decode_token(token: str):
+        # Tokens seen before skip signature verification until they expire
+        digest = token_digest(token)
+        claims = token_cache.get(digest)
+        if claims is not None:
+            return dict(claims)
+        
         credentials_exception = HTTPException(
         status_code=401,
         detail="Could not validate credentials",
@@ -35,12 +78,14 @@ class TokenData:
             username = payload.get("sub")
             if username is None:
                 raise credentials_exception
-            return {
+            claims = {
                 "sub": username,
                 "id": payload.get("id"),
                 "role": payload.get("role"),
                 "exp": payload.get("exp")
             }
+            token_cache.set(digest, claims)
+            return dict(claims)
             
         except ExpiredSignatureError:
             raise HTTPException(status_code=401, detail="Token has expired")
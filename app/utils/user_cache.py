@@ -0,0 +1,70 @@
+from typing import Dict, Optional
+from sqlalchemy import event
+from app.db.models import User
+from app.utils.lru_cache import LRUCache
+from app.core.config import USER_CACHE_TTL_SECONDS, USER_CACHE_MAX_ENTRIES
+
+
+class Principal:
+    """The authenticated user's fields handlers read, detached from any session."""
+
+    __slots__ = ("id", "email", "user_name", "role", "is_active")
+
+    def __init__(self, id: str, email: str, user_name: str, role: str, is_active: bool):
+        self.id = id
+        self.email = email
+        self.user_name = user_name
+        self.role = role
+        self.is_active = is_active
+
+    @classmethod
+    def from_user(cls, user_model: User) -> "Principal":
+        return cls(
+            id=user_model.id,
+            email=user_model.email,
+            user_name=user_model.user_name,
+            role=user_model.role,
+            is_active=user_model.is_active,
+        )
+
+
+class UserCache:
+    """Per-process LRU/TTL cache of principals keyed by user id.
+
+    Every invalidation bumps the user's generation; a lookup that started
+    before an update cannot store the old row afterwards. Other processes
+    see changes once their entry's TTL runs out.
+    """
+
+    def __init__(self, ttl: float = USER_CACHE_TTL_SECONDS, max_entries: int = USER_CACHE_MAX_ENTRIES):
+        self._entries: LRUCache[Principal] = LRUCache(max_entries, ttl)
+        self._generations: Dict[str, int] = {}
+        self._lock = self._entries.lock
+
+    def get(self, user_id: str) -> Optional[Principal]:
+        return self._entries.get(user_id)
+
+    def generation(self, user_id: str) -> int:
+        with self._lock:
+            return self._generations.get(user_id, 0)
+
+    def set(self, principal: Principal, generation: int):
+        with self._lock:
+            if self._generations.get(principal.id, 0) != generation:
+                return
+            self._entries.set(principal.id, principal)
+
+    def invalidate(self, user_id: str):
+        with self._lock:
+            self._entries.pop(user_id)
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+
+
+user_cache = UserCache()
+
+
+# Any flushed change to a user (profile edits, deactivation, deletion) drops the cached copy
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_user(mapper, connection, target):
+    user_cache.invalidate(target.id)
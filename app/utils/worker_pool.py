@@ -0,0 +1,134 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import List, Optional
+from sqlalchemy import update
+from app.db.database import AsyncSessionLocal
+
+
+async def requeue_stale(db, model, running_status: str, stale_seconds: float, **values):
+    """Queues again rows left in `running_status` by a process that died.
+
+    A row counts as abandoned once `updated_at` is over `stale_seconds`
+    old; `values` resets any other per-attempt columns at the same time.
+    """
+    cutoff = datetime.now() - timedelta(seconds=stale_seconds)
+    await db.execute(
+        update(model)
+        .filter(model.status == running_status, model.updated_at < cutoff)
+        .values(status="queued", **values)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+
+
+@asynccontextmanager
+async def keep_alive(model, interval: float, *criteria):
+    """Refreshes `updated_at` on the rows matching `criteria` every `interval`
+    seconds while the block runs, so stale sweeps leave work in progress alone."""
+    async def beat():
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                async with AsyncSessionLocal() as db:
+                    await db.execute(
+                        update(model)
+                        .filter(*criteria)
+                        .values(updated_at=datetime.now())
+                        .execution_options(synchronize_session=False)
+                    )
+                    await db.commit()
+            except Exception as e:
+                print(f"Keep-alive for {model.__tablename__} failed: {e}")
+
+    task = asyncio.create_task(beat())
+    try:
+        yield
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+
+class WorkerPool:
+    """Runs `concurrency` asyncio workers over work queued in the database.
+
+    Subclasses implement `run_once`, which handles one unit of work with a
+    fresh session and returns True when more is probably waiting. Otherwise
+    the worker sleeps until `notify` is called or `poll_interval` passes.
+    `recover` takes back work abandoned by a process that died; it runs at
+    start, before any worker, and then every `sweep_interval` seconds so
+    work orphaned by a sibling process is not left until the next restart.
+    """
+
+    name = "Worker"
+
+    def __init__(self, concurrency: int, poll_interval: float, sweep_interval: Optional[float] = None):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.sweep_interval = sweep_interval
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._next_sweep = 0.0
+
+    async def start(self):
+        self._wakeup = asyncio.Event()
+        async with AsyncSessionLocal() as db:
+            await self.recover(db)
+        self._schedule_sweep()
+        self._tasks = [asyncio.create_task(self._worker(index)) for index in range(self.concurrency)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _schedule_sweep(self):
+        if self.sweep_interval is not None:
+            self._next_sweep = time.monotonic() + self.sweep_interval
+
+    def _sweep_due(self) -> bool:
+        # Checked and rescheduled without awaiting, so one worker sweeps per interval
+        if self.sweep_interval is None or time.monotonic() < self._next_sweep:
+            return False
+        self._schedule_sweep()
+        return True
+
+    def notify(self):
+        """Wakes idle workers after work has been queued."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def recover(self, db):
+        pass
+
+    async def run_once(self, db, index: int) -> bool:
+        raise NotImplementedError
+
+    async def before_wait(self, index: int):
+        """Called each time worker `index` is about to go idle."""
+
+    async def _wait_for_work(self, index: int):
+        await self.before_wait(index)
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    async def _worker(self, index: int):
+        while True:
+            db = AsyncSessionLocal()
+            try:
+                if self._sweep_due():
+                    await self.recover(db)
+                if not await self.run_once(db, index):
+                    await self._wait_for_work(index)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"{self.name} error: {e}")
+                await asyncio.sleep(self.poll_interval)
+            finally:
+                await db.close()
@@ -1,16 +1,50 @@
+from contextlib import asynccontextmanager
 from datetime import timedelta
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from fastapi.middleware.cors import CORSMiddleware
 from app.db import models
 from app.db import database
 from app.api import router as api_router
 from app.utils.token_config import TokenData                
+from ai.main_agent import close_clients
+from app.utils.redis_config import close_redis
+from app.db.database import close_db
+from app.db.migrations import run_migrations
+from app.utils.revocation_config import revocation_list
+from app.utils.password_config import password_hasher
+from app.utils.mail_config import mail_sender
+from app.services.reports import report_workers
+from app.utils.pdf_config import pdf_pool, start_pdf_pool
+from app.utils.cloud_storage_config import storage_service
 
 # Create tables
 models.Base.metadata.create_all(bind=database.engine)
+run_migrations(database.engine)
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await revocation_list.start()
+    await password_hasher.start()
+    await start_pdf_pool()
+    await report_workers.start()
+    await mail_sender.start()
+    yield
+    await mail_sender.stop()
+    await report_workers.stop()
+    await pdf_pool.close()
+    storage_service.close()
+    # Release pooled connections held by the shared GenAI clients
+    await close_clients()
+    await revocation_list.stop()
+    password_hasher.close()
+    await close_redis()
+    await close_db()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Middleware
 app.add_middleware(
@@ -35,7 +69,14 @@ PUBLIC_PATHS = [
     "/api/v1/auth/verify",
     "/api/v1/user/me/forgot-password",
     "/api/v1/user/me/reset-password",
+    "/metrics",
 ]
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint."""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
         
         
 # Include routers dynamically